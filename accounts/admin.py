@@ -1,3 +1,11 @@
 from django.contrib import admin
+from .models import Account
 
 # Register your models here.
+
+
+@admin.register(Account)
+class AccountAdmin(admin.ModelAdmin):
+    list_display = ("name", "id", "balance")
+    search_fields = ("name_normalized",)
+    ordering = ("name", "id")
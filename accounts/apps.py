@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401 register system checks, connect cache invalidation receivers
+        from docspert import db  # noqa: F401 connect SQLite pragmas receiver
+        from .search import reinstall_missing_triggers
+
+        post_migrate.connect(reinstall_missing_triggers, sender=self, dispatch_uid="accounts.search.reinstall_missing_triggers")
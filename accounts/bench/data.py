@@ -0,0 +1,52 @@
+from decimal import Decimal
+import csv
+import random
+import uuid
+
+FIRST_NAMES = ["Joy", "Bryan", "Jamie", "Lauren", "Gregory", "Anna", "Omar", "Mona", "Karim", "Sara"]
+LAST_NAMES = ["Dean", "Rice", "Lopez", "David", "Elliott", "Hassan", "Smith", "Adel", "Nabil", "Fathy"]
+
+
+def generate_records(count, seed=0):
+    """Yield `count` deterministic synthetic account records in upload format (string values)"""
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}",
+            "balance": str(Decimal(rng.randrange(0, 10_000_000)) / 100),
+        }
+
+
+def write_accounts_file(path, count, file_format="csv", seed=0):
+    """Write synthetic accounts file accepted by the upload form & import_accounts command"""
+    if file_format == "parquet":
+        return write_parquet_file(path, count, seed)
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(["ID", "Name", "Balance"])
+            writer.writerows((r["id"], r["name"], r["balance"]) for r in generate_records(count, seed))
+        else:
+            file.write("ID\tName\tBalance\n")
+            file.writelines(
+                f"{r['id']}\t{r['name']}\t{r['balance']}\n" for r in generate_records(count, seed)
+            )
+    return path
+
+
+def write_parquet_file(path, count, seed=0):
+    """Parquet file with string ID & Name and decimal Balance columns, needs pyarrow"""
+    import pyarrow as pa
+    import pyarrow.parquet
+
+    records = list(generate_records(count, seed))
+    table = pa.table(
+        {
+            "ID": [r["id"] for r in records],
+            "Name": [r["name"] for r in records],
+            "Balance": pa.array([Decimal(r["balance"]) for r in records], pa.decimal128(20, 2)),
+        }
+    )
+    pyarrow.parquet.write_table(table, path)
+    return path
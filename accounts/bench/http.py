@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+import statistics
+import time
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    index = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def fetch(url, timeout):
+    """Request url once, return (latency in seconds, succeeded)"""
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 500
+    except HTTPError as e:
+        ok = e.code < 500  # 4xx are valid answers of the view (e.g. insufficient balance)
+    except (URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_load(urls, requests=1000, concurrency=10, timeout=30):
+    """Send `requests` GET requests cycling over urls using `concurrency` client threads.
+    Return dict with throughput and latency percentiles in milliseconds."""
+    urls = list(urls)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(lambda index: fetch(urls[index % len(urls)], timeout), range(requests))
+        )
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(not ok for _, ok in results),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+    }
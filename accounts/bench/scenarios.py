@@ -0,0 +1,318 @@
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.core.files import File
+from accounts.cache import get_cache
+from accounts.columnar import ColumnarSource, pa, save_columnar
+from accounts.importers import ImportStats, convert_records, iter_records, open_upload, save_accounts, write_batches
+from accounts.models import Account
+from accounts.parallel import import_file
+from accounts.services import transfer_funds
+from .data import LAST_NAMES, generate_records, write_accounts_file
+from .http import percentile
+import django
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+
+
+def measure(operation, count):
+    """Call operation(index) count times, return ops, seconds & latency percentiles"""
+    latencies = []
+    start = time.perf_counter()
+    for index in range(count):
+        request_start = time.perf_counter()
+        operation(index)
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "ops": count,
+        "seconds": seconds,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def check_response(response):
+    if response.status_code >= 500:
+        raise RuntimeError(f"Benchmark request failed with status {response.status_code}")
+    return response
+
+
+def upload(size, workdir):
+    """POST csv file with `size` accounts through AccountsUploadView (parse, validate & insert)"""
+    path = write_accounts_file(os.path.join(workdir, f"accounts-{size}.csv"), size)
+    client = Client()
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        check_response(client.post(reverse("accounts_upload"), {"file": file}))
+    seconds = time.perf_counter() - start
+    if Account.objects.count() < size:
+        raise RuntimeError("Benchmark upload did not insert all generated accounts")
+    return {"ops": size, "seconds": seconds}
+
+
+def search(size, workdir, requests=200):
+    """Json search requests with distinct name fragments, cache cleared so database is searched"""
+    get_cache().clear()
+    client = Client()
+    rng = random.Random(1)
+    queries = [f"{rng.choice(LAST_NAMES)} {rng.randrange(size)}" for _ in range(requests)]
+    url = reverse("account_search")
+    return measure(lambda index: check_response(client.get(url, {"search_query": queries[index]})), requests)
+
+
+def list_pages(size, workdir, pages=50):
+    """Render accounts list pages following next cursor, page N should cost the same as page 1"""
+    client = Client()
+    url = reverse("accounts_list")
+    state = {"cursor": None}
+
+    def next_page(index):
+        params = {"cursor": state["cursor"]} if state["cursor"] else {}
+        response = check_response(client.get(url, params))
+        state["cursor"] = response.context["next_cursor"] if response.context else None
+
+    return measure(next_page, pages)
+
+
+def list_render(cached=True, stream=False):
+    """Scenario rendering accounts list pages of 100 cards with cold or warm cards cache, or streamed.
+    Pages are visited once (not streamed) before measuring, that collects their cursors and warms the cache"""
+
+    def scenario(size, workdir, pages=50):
+        client = Client()
+        url = reverse("accounts_list")
+        cursors = [None]
+
+        def get_page(index):
+            params = {"page_size": 100, **({"cursor": cursors[index]} if cursors[index] else {})}
+            response = check_response(client.get(url, params))
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+            return response, body
+
+        get_cache().clear()
+        with override_settings(ACCOUNTS_CARD_CACHE_TIMEOUT=3600 if cached else 0, ACCOUNTS_LIST_STREAM=False):
+            for index in range(pages - 1):
+                response, _ = get_page(index)
+                cursors.append(response.context["next_cursor"])
+            with override_settings(ACCOUNTS_LIST_STREAM=stream):
+                return measure(get_page, pages)
+
+    return scenario
+
+
+def transfer(size, workdir, requests=200):
+    """Sequential transfers through TransferFundsView between random accounts"""
+    client = Client()
+    rng = random.Random(2)
+    ids = list(Account.objects.values_list("pk", flat=True)[:1000])
+    url = reverse("transfer_balance")
+
+    def send(index):
+        source, target = rng.sample(ids, 2)
+        check_response(client.get(url, {"transfer_from": source, "transfer_to": target, "transfer_balance": "0.01"}))
+
+    return measure(send, requests)
+
+
+def transfer_contention(size, workdir, threads=8, transfers_per_thread=25, hot_accounts=4):
+    """Concurrent transfers between a few hot accounts, counts failed transfers"""
+    ids = list(Account.objects.values_list("pk", flat=True)[:hot_accounts])
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(transfers_per_thread):
+                source, target = rng.sample(ids, 2)
+                try:
+                    transfer_funds(source, target, "0.01")
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {
+        "ops": threads * transfers_per_thread,
+        "seconds": time.perf_counter() - start,
+        "errors": len(errors),
+    }
+
+
+def concurrent_transfers(size, workdir, threads=8, transfers_per_thread=50):
+    """Concurrent transfers where each thread works on its own accounts, measures write throughput
+    of the database (lock waits, journal) without contention on the same rows"""
+    ids = list(Account.objects.values_list("pk", flat=True)[: threads * 2])
+    errors = []
+
+    def worker(index):
+        source, target = ids[index * 2], ids[index * 2 + 1]
+        try:
+            for _ in range(transfers_per_thread):
+                try:
+                    transfer_funds(source, target, "0.01")
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {
+        "ops": threads * transfers_per_thread,
+        "seconds": time.perf_counter() - start,
+        "errors": len(errors),
+    }
+
+
+def import_parallel(size, workdir):
+    """import_accounts engine on a txt file of `size` new accounts using all cores"""
+    path = write_accounts_file(os.path.join(workdir, f"accounts-{size}.txt"), size, "txt", seed=1)
+    start = time.perf_counter()
+    stats = import_file(path, workers=os.cpu_count())
+    return {"ops": stats.parsed, "seconds": time.perf_counter() - start}
+
+
+def insert_loader(loader):
+    """Scenario writing `size` new converted accounts with given ACCOUNTS_IMPORT_LOADER,
+    rolled back afterwards so every loader inserts into the same table"""
+
+    def scenario(size, workdir):
+        records = list(convert_records(generate_records(size, seed=2), ImportStats()))
+        with override_settings(ACCOUNTS_IMPORT_LOADER=loader), transaction.atomic():
+            start = time.perf_counter()
+            stats = write_batches(records)
+            seconds = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return {"ops": stats.inserted, "seconds": seconds}
+
+    scenario.__doc__ = f"Insert converted accounts using {loader} loader"
+    return scenario
+
+
+def import_format(file_format):
+    """Scenario importing a file of `size` new accounts in one process from csv or parquet,
+    rolled back afterwards so both formats insert into the same table"""
+
+    def scenario(size, workdir):
+        if file_format == "parquet" and pa is None:
+            raise RuntimeError("parquet scenario needs pyarrow installed")
+        path = write_accounts_file(os.path.join(workdir, f"accounts-{size}.{file_format}"), size, file_format, seed=3)
+        with open(path, "rb") as file, transaction.atomic():
+            start = time.perf_counter()
+            if file_format == "parquet":
+                stats = save_columnar(ColumnarSource(File(file), "parquet"))
+            else:
+                stats = save_accounts(iter_records(*open_upload(File(file), "text/csv")))
+            seconds = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return {"ops": stats.inserted, "seconds": seconds}
+
+    scenario.__doc__ = f"Import {file_format} file in one process"
+    return scenario
+
+
+# Ordered, upload loads the data set used by the following scenarios
+SCENARIOS = {
+    "upload": upload,
+    "search": search,
+    "list": list_pages,
+    "render_uncached": list_render(cached=False),
+    "render_cached": list_render(),
+    "render_stream": list_render(stream=True),
+    "transfer": transfer,
+    "transfer_contention": transfer_contention,
+    "concurrent_transfers": concurrent_transfers,
+    "import_parallel": import_parallel,
+    "insert_raw": insert_loader("raw"),
+    "insert_orm": insert_loader("orm"),
+    "import_csv": import_format("csv"),
+    "import_parquet": import_format("parquet"),
+}
+
+
+def run_benchmarks(sizes, scenarios=None, workdir=None):
+    """Run scenarios for each data size against current database, return list of result dicts.
+    Database is flushed before each size so sizes do not add up."""
+    names = list(scenarios or SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    results = []
+    # scenarios measure the views, not the limits guarding them
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp, override_settings(ADMISSION_CONTROL=False):
+        for size in sizes:
+            # truncate tables, deleting 1M accounts through the orm would load them for signals
+            call_command("flush", interactive=False, verbosity=0)
+            get_cache().clear()
+            if "upload" not in names:  # other scenarios need accounts to work on
+                upload(size, tmp)
+            for name in SCENARIOS:
+                if name not in names:
+                    continue
+                result = SCENARIOS[name](size, tmp)
+                result.update(
+                    scenario=name,
+                    size=size,
+                    seconds=round(result["seconds"], 4),
+                    ops_per_sec=round(result["ops"] / result["seconds"], 2) if result["seconds"] else 0.0,
+                )
+                results.append(result)
+    return results
+
+
+def host_info():
+    """Machine, python & database the results were measured on, saved next to them"""
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "database_version": database_version(),
+    }
+
+
+def database_version():
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version
+    if connection.vendor == "postgresql":
+        return str(connection.pg_version)
+    return ""
+
+
+def same_host(host, baseline_host):
+    """Throughput of two runs is only comparable on the same kind of machine and database"""
+    keys = ["machine", "cpu_count", "python", "database"]
+    return bool(baseline_host) and all(host.get(key) == baseline_host.get(key) for key in keys)
+
+
+def compare_results(results, baseline, tolerance=0.2, compare_throughput=True):
+    """Return regressions: results with errors (failed transfers...) and, when compare_throughput,
+    results with ops_per_sec lower than baseline by more than tolerance.
+    Scenarios missing from baseline are only checked for errors."""
+    expected = {(r["scenario"], r["size"]): r["ops_per_sec"] for r in baseline}
+    regressions = []
+    for result in results:
+        base = expected.get((result["scenario"], result["size"]))
+        slower = compare_throughput and base and result["ops_per_sec"] < base * (1 - tolerance)
+        if result.get("errors") or slower:
+            regressions.append(dict(result, baseline_ops_per_sec=base))
+    return regressions
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import Account
+import hashlib
+import json
+import time
+
+DEFAULT_CACHE_ALIAS = "accounts"
+GENERATION_KEY = "accounts:generation"
+
+
+def get_cache():
+    """Cache used for accounts, configured by CACHES[ACCOUNTS_CACHE_ALIAS] (local memory LRU by default)"""
+    return caches[getattr(settings, "ACCOUNTS_CACHE_ALIAS", DEFAULT_CACHE_ALIAS)]
+
+
+def account_key(pk):
+    return f"account:{pk}"
+
+
+async def aget_generation():
+    """Version of all cached search results, bumped whenever any account changes"""
+    cache = get_cache()
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        # start from current time, never reuse a generation of entries that may still be cached
+        await cache.aadd(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+def search_digest(parts):
+    return hashlib.md5(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def get_account(pk):
+    """Read through cache lookup of account by uuid, raise Account.DoesNotExist if it does not exist"""
+    cache = get_cache()
+    account = cache.get(account_key(pk))
+    if account is None:
+        account = Account.objects.get(pk=pk)
+        cache.set(account_key(pk), account)
+    return account
+
+
+async def aget_or_set_search(parts, compute):
+    """Return cached search result for parts (query, cursor...) or await compute() and cache it"""
+    cache = get_cache()
+    key = f"search:{await aget_generation()}:{search_digest(parts)}"
+    result = await cache.aget(key)
+    if result is None:
+        result = await compute()
+        await cache.aset(key, result)
+    return result
+
+
+def _invalidate(pks):
+    cache = get_cache()
+    cache.delete_many([account_key(pk) for pk in pks])
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:  # generation was evicted, next read starts a new one
+        pass
+
+
+def invalidate_accounts(pks=()):
+    """Drop cached accounts and all cached search results.
+    Done right away and again after current transaction commits, so a value read
+    by another request before the commit can not survive in cache."""
+    pks = list(pks)
+    _invalidate(pks)
+    transaction.on_commit(lambda: _invalidate(pks))
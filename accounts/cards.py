@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+from .cache import get_cache
+import hashlib
+
+CARD_TEMPLATE = "account-card.html"
+DEFAULT_CARD_VERSION = 1
+DEFAULT_CARD_CACHE_TIMEOUT = 3600
+DEFAULT_STREAM_CHUNK_SIZE = 20
+
+
+def card_key(account):
+    """Cache key of rendered card of account. Card shows id & name only, so a cached card stays
+    valid while the name is the same, ACCOUNTS_CARD_VERSION is bumped when the card template changes"""
+    version = getattr(settings, "ACCOUNTS_CARD_VERSION", DEFAULT_CARD_VERSION)
+    name = hashlib.md5(account.name.encode("utf-8"), usedforsecurity=False).hexdigest()
+    return f"card:{version}:{account.pk}:{name}"
+
+
+def render_cards(accounts):
+    """Rendered html card of each account. Cached cards are read with one get_many, missing ones
+    are rendered (two url reversals each) and stored with one set_many"""
+    timeout = getattr(settings, "ACCOUNTS_CARD_CACHE_TIMEOUT", DEFAULT_CARD_CACHE_TIMEOUT)
+    cache = get_cache()
+    keys = [card_key(account) for account in accounts]
+    cached = cache.get_many(keys) if timeout != 0 else {}
+    template = get_template(CARD_TEMPLATE)
+    missing = {}
+    cards = []
+    for key, account in zip(keys, accounts):
+        card = cached.get(key)
+        if card is None:
+            card = missing[key] = str(template.render({"account": account}))
+        cards.append(mark_safe(card))
+    if missing and timeout != 0:
+        cache.set_many(missing, timeout)
+    return cards
+
+
+def iter_cards(accounts, chunk_size=None):
+    """Yield html of cards of accounts, chunk_size cards at a time"""
+    chunk_size = chunk_size or getattr(settings, "ACCOUNTS_LIST_STREAM_CHUNK_SIZE", DEFAULT_STREAM_CHUNK_SIZE)
+    for start in range(0, len(accounts), chunk_size):
+        yield "".join(render_cards(accounts[start : start + chunk_size]))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.db import connections
+
+LOCAL_CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+DATABASE_CACHE_BACKEND = "django.core.cache.backends.db.DatabaseCache"
+
+
+@register(Tags.caches, deploy=True)
+def check_accounts_cache(app_configs, **kwargs):
+    """Accounts cache is invalidated by the process writing accounts, so with several processes
+    (gunicorn workers, process_imports...) it has to be shared by all of them, and not be
+    a SQLite table whose writes would queue on the lock transfers need"""
+    alias = getattr(settings, "ACCOUNTS_CACHE_ALIAS", "accounts")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend == LOCAL_CACHE_BACKEND:
+        return [
+            Error(
+                f"Cache {alias!r} is local to each process, other processes would serve stale balances after a write.",
+                hint="Set REDIS_URL or MEMCACHED_LOCATION, or DOCSPERT_RUN_MODE=production to run without it.",
+                id="accounts.E001",
+            )
+        ]
+    if backend == DATABASE_CACHE_BACKEND and connections["default"].vendor == "sqlite":
+        return [
+            Error(
+                f"Cache {alias!r} is a SQLite table, every cache write would take the database write lock.",
+                hint="Set REDIS_URL or MEMCACHED_LOCATION, or use DummyCache to run without it.",
+                id="accounts.E002",
+            )
+        ]
+    return []
@@ -0,0 +1,300 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+from docspert.metrics import span
+from .fields import MAX_CENTS, from_cents, to_cents
+from .importers import (
+    DEFAULT_IMPORT_LOADER,
+    NAME_MAX_LENGTH,
+    REQUIRED_HEADERS,
+    ImportMode,
+    ImportStats,
+    convert_record,
+    insert_row_batch,
+    map_file,
+    write_batches,
+)
+from .search import normalize_name
+from decimal import Decimal
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet & Arrow uploads are refused without it
+    pa = None
+
+# first bytes of each supported columnar format
+COLUMNAR_MAGIC_BYTES = {
+    "parquet": b"PAR1",
+    "arrow": b"ARROW1",  # Arrow IPC file (random access, .arrow / .feather v2)
+    "arrow-stream": b"\xff\xff\xff\xff",  # Arrow IPC stream, starts with a continuation marker
+}
+COLUMNAR_FORMATS = ["parquet", "arrow"]
+# rows converted at once, bigger batches make vectorized conversion cheaper per row
+READ_BATCH_SIZE = 64 * 1024
+UUID_HEX_PATTERN = "^[0-9a-f]{32}$"
+# ASCII whitespace runs collapsed by str.split() in normalize_name
+ASCII_WHITESPACE_PATTERN = r"[\t\n\x0b\x0c\r\x1c-\x1f ]+"
+MAX_BALANCE_UNITS = MAX_CENTS // 100
+
+# raised by broken files while they are read
+COLUMNAR_ERRORS = (pa.ArrowException, OSError) if pa else (OSError,)
+
+
+def detect_columnar(file):
+    """Name of columnar format of binary file ("parquet", "arrow", "arrow-stream") found from its
+    magic bytes, None for other files. File position is left at the start"""
+    file.seek(0)
+    head = file.read(6)
+    file.seek(0)
+    for name, magic in COLUMNAR_MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_arrow_file(uploaded_file):
+    """Arrow readable file of upload, files on local disk are memory mapped so batches are read
+    without copies, other ones are read through their python file object"""
+    mapped = map_file(uploaded_file)
+    if mapped is None:
+        uploaded_file.seek(0)
+        return pa.PythonFile(uploaded_file, mode="r")
+    return pa.BufferReader(pa.py_buffer(mapped))
+
+
+def is_string(data_type):
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+
+def is_uuid_binary(data_type):
+    if isinstance(data_type, pa.BaseExtensionType):  # arrow.uuid extension type
+        data_type = data_type.storage_type
+    return pa.types.is_fixed_size_binary(data_type) and data_type.byte_width == 16
+
+
+def is_balance_type(data_type):
+    return (
+        pa.types.is_integer(data_type)
+        or pa.types.is_floating(data_type)
+        or pa.types.is_decimal(data_type)
+        or is_string(data_type)
+    )
+
+
+# column name: check of its arrow type
+COLUMN_TYPES = {
+    "id": lambda data_type: is_string(data_type) or is_uuid_binary(data_type),
+    "name": is_string,
+    "balance": is_balance_type,
+}
+
+
+def match_columns(schema):
+    """Names of ID, Name & Balance columns of schema (matched case insensitively),
+    raise ValidationError when one is missing or of an unsupported type"""
+    names = {name.lower(): name for name in schema.names}
+    missing = [header for header in REQUIRED_HEADERS if header.lower() not in names]
+    if missing:
+        raise ValidationError(
+            f"File is not valid may be empty or not in correct structure, expected columns: {', '.join(REQUIRED_HEADERS)}"
+        )
+    columns = [names[header.lower()] for header in REQUIRED_HEADERS]
+    for column in columns:
+        data_type = schema.field(column).type
+        if not COLUMN_TYPES[column.lower()](data_type):
+            raise ValidationError(f"Unsupported type of {column} column: {data_type}")
+    return columns
+
+
+class ColumnarSource:
+    """Parquet or Arrow IPC accounts file, read in record batches of ID, Name & Balance columns.
+    Schema is checked when opened so invalid files are refused before anything is saved."""
+
+    def __init__(self, uploaded_file, file_format):
+        if pa is None:
+            raise ValidationError("Parquet & Arrow files need the pyarrow package installed.")
+        self.file_format = file_format
+        source = open_arrow_file(uploaded_file)
+        if file_format == "parquet":
+            self.reader = pyarrow.parquet.ParquetFile(source)
+            schema = self.reader.schema_arrow
+        elif file_format == "arrow":
+            self.reader = pyarrow.ipc.open_file(source)
+            schema = self.reader.schema
+        else:
+            self.reader = pyarrow.ipc.open_stream(source)
+            schema = self.reader.schema
+        self.columns = match_columns(schema)
+
+    def batches(self, size=READ_BATCH_SIZE):
+        """Yield record batches of at most size rows with ID, Name & Balance columns in that order.
+        Parquet reads only these columns from disk, Arrow batches are sliced without copies"""
+        if self.file_format == "parquet":
+            yield from self.reader.iter_batches(batch_size=size, columns=self.columns)
+            return
+        if self.file_format == "arrow":
+            batches = (self.reader.get_batch(index) for index in range(self.reader.num_record_batches))
+        else:
+            batches = self.reader
+        for batch in batches:
+            batch = batch.select(self.columns)
+            for start in range(0, batch.num_rows, size):
+                yield batch.slice(start, size)
+
+    def rows(self, stats, skip_invalid=False, rejected=None):
+        """Yield (lowercase hex id, name, name_normalized, cents) tuples of valid rows, see convert_records.
+        Columns are converted a batch at a time, rows the vectorized conversion could not convert
+        are retried with convert_record which also gives the reason of rejection."""
+        seen = set()
+        for batch in self.batches():
+            ids, names, names_normalized, cents, valid = convert_batch(batch)
+            for index, pk in enumerate(ids):
+                stats.parsed += 1
+                if valid[index]:
+                    row = (pk, names[index], names_normalized[index], cents[index])
+                else:
+                    record = batch_record(batch, index)
+                    try:
+                        account = convert_record(record)
+                    except ValidationError as e:
+                        if not skip_invalid:
+                            raise
+                        stats.rejected += 1
+                        if rejected is not None:
+                            rejected.add(stats.parsed, record, e.messages[0])
+                        continue
+                    row = (account["id"].hex, account["name"], account["name_normalized"], to_cents(account["balance"]))
+                if row[0] in seen:
+                    stats.rejected += 1
+                    if rejected is not None:
+                        rejected.add(stats.parsed, batch_record(batch, index), "Duplicate ID in file")
+                    continue
+                seen.add(row[0])
+                yield row
+
+
+def batch_record(batch, index):
+    """Row of batch as a record like the ones parsed from csv files"""
+    pk, name, balance = (column[index].as_py() for column in batch.columns)
+    return {
+        "id": pk.hex() if isinstance(pk, bytes) else str(pk) if isinstance(pk, uuid.UUID) else pk,
+        "name": name,
+        # as written in file, so float balances are rounded like their text form
+        "balance": None if balance is None else str(balance),
+    }
+
+
+def convert_batch(batch):
+    """Vectorized conversion of a record batch with ID, Name & Balance columns.
+    Return (ids, names, names_normalized, cents, valid) lists, ids are lowercase hex,
+    valid tells which rows were converted"""
+    ids, ids_valid = convert_ids(batch.column(0))
+    names = batch.column(1)
+    names_valid = pc.less_equal(pc.utf8_length(names), NAME_MAX_LENGTH)
+    try:
+        cents, balances_valid = convert_balances(batch.column(2))
+    except pa.ArrowInvalid:  # values the cast can't hold, whole batch is converted row by row
+        cents, balances_valid = pa.nulls(len(batch), pa.int64()), pa.array([False] * len(batch))
+    valid = pc.fill_null(pc.and_(pc.and_(ids_valid, names_valid), balances_valid), False)
+    return (
+        ids.to_pylist(),
+        names.to_pylist(),
+        normalize_names(names),
+        cents.to_pylist(),
+        valid.to_pylist(),
+    )
+
+
+def convert_ids(ids):
+    """Lowercase hex of ids and mask of valid ones. Text ids with or without hyphens are checked by
+    regex, other forms accepted by uuid.UUID (braces, urn) are left to convert_record"""
+    if isinstance(ids, pa.ExtensionArray):
+        ids = ids.storage
+    if pa.types.is_fixed_size_binary(ids.type):
+        return pa.array([None if pk is None else pk.hex() for pk in ids.to_pylist()], pa.string()), ids.is_valid()
+    ids = pc.utf8_lower(pc.replace_substring(ids, "-", ""))
+    return ids, pc.match_substring_regex(ids, UUID_HEX_PATTERN)
+
+
+def convert_balances(balances):
+    """Integer cents of balances rounded half to even like Decimal.quantize, and mask of the ones
+    fitting in MoneyField. Raise ArrowInvalid when a cast fails"""
+    data_type = balances.type
+    if pa.types.is_integer(data_type):
+        valid = pc.and_(
+            pc.greater_equal(balances, -MAX_BALANCE_UNITS), pc.less_equal(balances, MAX_BALANCE_UNITS)
+        )
+        units = pc.cast(pc.if_else(valid, balances, 0), pa.int64())
+        return pc.multiply(units, 100), valid
+    if pa.types.is_floating(data_type):
+        cents = pc.round(pc.multiply(pc.cast(balances, pa.float64()), 100.0), round_mode="half_to_even")
+        valid = pc.and_(pc.is_finite(cents), pc.less(pc.abs(cents), 2.0**63))
+        return pc.cast(pc.if_else(valid, cents, 0.0), pa.int64()), valid
+    if is_string(data_type):
+        balances = pc.cast(balances, pa.decimal128(38, 18))
+    # decimal(20, 2) holds every bigint number of cents
+    amounts = pc.cast(pc.round(balances, ndigits=2, round_mode="half_to_even"), pa.decimal128(20, 2))
+    cents = pc.cast(pc.multiply(amounts, pa.scalar(Decimal(100), pa.decimal128(3, 0))), pa.int64())
+    return cents, pc.greater_equal(cents, -MAX_CENTS)
+
+
+def normalize_names(names):
+    """normalize_name of every name, done by arrow kernels when names are ASCII
+    (str.split() and str.lower() then behave like the regex & ascii_lower)"""
+    if pc.all(pc.string_is_ascii(names)).as_py() is not False:
+        collapsed = pc.replace_substring_regex(names, ASCII_WHITESPACE_PATTERN, " ")
+        return pc.ascii_lower(pc.utf8_trim(collapsed, " ")).to_pylist()
+    return [None if name is None else normalize_name(name) for name in names.to_pylist()]
+
+
+def account_records(rows):
+    """Records (dicts) of converted rows for loaders that work on records (upsert, orm loader)"""
+    for pk, name, name_normalized, cents in rows:
+        yield {
+            "id": uuid.UUID(hex=pk),
+            "name": name,
+            "name_normalized": name_normalized,
+            "balance": from_cents(cents),
+        }
+
+
+def db_rows(rows):
+    """Rows with ids in the format of UUIDField column, hex strings are already it on SQLite"""
+    if not connection.features.has_native_uuid_field:
+        return rows
+    return ((uuid.UUID(hex=pk), *values) for pk, *values in rows)
+
+
+def save_columnar(
+    source,
+    batch_size=None,
+    stats=None,
+    skip_invalid=False,
+    on_batch=None,
+    mode=ImportMode.INSERT,
+    rejected=None,
+    atomic=None,
+):
+    """save_accounts for a ColumnarSource. In insert mode with the raw loader converted rows go
+    straight from arrow columns to INSERT (COPY) tuples, no dict or Decimal is built per row."""
+    stats = stats or ImportStats()
+    rows = source.rows(stats, skip_invalid, rejected)
+    loader = getattr(settings, "ACCOUNTS_IMPORT_LOADER", DEFAULT_IMPORT_LOADER)
+    if mode == ImportMode.INSERT and loader == "raw":
+        accounts, write_batch = db_rows(rows), insert_row_batch
+    else:
+        accounts, write_batch = account_records(rows), None
+    with span("save_columnar"):
+        return write_batches(
+            accounts,
+            batch_size=batch_size,
+            stats=stats,
+            atomic=not skip_invalid if atomic is None else atomic,
+            on_batch=on_batch,
+            mode=mode,
+            write_batch=write_batch,
+        )
@@ -0,0 +1,77 @@
+from django.core.exceptions import ValidationError
+import gzip
+import io
+import os
+import zipfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd uploads are refused without it
+    zstandard = None
+
+# first bytes of each supported archive format
+MAGIC_BYTES = {
+    "gzip": b"\x1f\x8b",
+    "zip": b"PK\x03\x04",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+COMPRESSED_EXTENSIONS = [".gz", ".zip", ".zst"]
+CONTENT_TYPES = {".csv": "text/csv", ".txt": "text/plain"}
+
+# raised by broken archives while they are decompressed
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error, zipfile.BadZipFile) + (
+    (zstandard.ZstdError,) if zstandard else ()
+)
+
+
+def detect_compression(file):
+    """Name of compression of binary file ("gzip", "zip", "zstd") found from its magic bytes,
+    None for plain files. File position is left at the start"""
+    file.seek(0)
+    head = file.read(4)
+    file.seek(0)
+    for name, magic in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def guess_content_type(name):
+    """text/csv or text/plain guessed from file name, ignoring compression extension, None if unknown"""
+    root, extension = os.path.splitext(name or "")
+    if extension.lower() in COMPRESSED_EXTENSIONS:
+        root, extension = os.path.splitext(root)
+    return CONTENT_TYPES.get(extension.lower())
+
+
+def sniff_content_type(stream):
+    """Content type of decompressed stream from its header line, tab separated means txt"""
+    head = stream.peek(4096)
+    return "text/plain" if b"\t" in head.split(b"\n", 1)[0] else "text/csv"
+
+
+def open_zip_member(file):
+    """Stream of the only file of zip archive, zip central directory is at the end so file must be seekable"""
+    archive = zipfile.ZipFile(file)
+    members = [member for member in archive.infolist() if not member.is_dir()]
+    if len(members) != 1:
+        raise ValidationError("Zip archive must contain exactly one accounts file.")
+    return archive.open(members[0]), members[0].filename
+
+
+def open_decompressed(file, compression, raw=None):
+    """Binary stream of decompressed content of file, decompressed chunk by chunk while it is read.
+    raw is the stream compressed bytes are read from (file itself if not given).
+    Return (stream, name of inner file or None)"""
+    raw = raw or file
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb"), None
+    if compression == "zip":
+        return open_zip_member(file)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValidationError("zstd compressed files need the zstandard package installed.")
+        # BufferedReader adds peek() used to sniff the header line
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw)), None
+    raise ValueError(f"Unsupported compression: {compression!r}")
@@ -0,0 +1,123 @@
+from django.conf import settings
+from .importers import REQUIRED_HEADERS, batched
+from .models import Account
+import csv
+import io
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet & Arrow exports are not offered without it
+    pa = None
+
+DEFAULT_EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+# binary formats, their chunks are bytes
+COLUMNAR_EXPORT_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+if pa:
+    EXPORT_FORMATS.update(COLUMNAR_EXPORT_FORMATS)
+
+
+def export_rows(queryset=None, chunk_size=None):
+    """Yield (id, name, balance) tuples of accounts, fetched chunk_size rows at a time
+    (server side cursor where database supports it), so memory does not grow with table size."""
+    chunk_size = chunk_size or getattr(
+        settings, "ACCOUNTS_EXPORT_CHUNK_SIZE", DEFAULT_EXPORT_CHUNK_SIZE
+    )
+    queryset = Account.objects.all() if queryset is None else queryset
+    return queryset.order_by().values_list("id", "name", "balance").iterator(
+        chunk_size=chunk_size
+    )
+
+
+def iter_csv(rows, chunk_size=DEFAULT_EXPORT_CHUNK_SIZE):
+    """Yield csv text in chunks, same headers & structure as uploaded csv files so exports can be re-imported"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIRED_HEADERS)
+    yield buffer.getvalue()
+    for batch in batched(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((str(pk), name, str(balance)) for pk, name, balance in batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows, chunk_size=DEFAULT_EXPORT_CHUNK_SIZE):
+    """Yield newline delimited json text in chunks, one account object per line"""
+    for batch in batched(rows, chunk_size):
+        yield "".join(
+            json.dumps({"id": str(pk), "name": name, "balance": str(balance)}) + "\n"
+            for pk, name, balance in batch
+        )
+
+
+class ExportBuffer(io.RawIOBase):
+    """Write only binary file keeping written bytes until they are taken. Position counts every
+    byte ever written so Parquet & Arrow writers compute their offsets while output is streamed"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def columnar_schema():
+    # same columns as uploaded files, decimal(20, 2) holds every MoneyField amount exactly
+    return pa.schema(
+        [("ID", pa.string()), ("Name", pa.string()), ("Balance", pa.decimal128(20, 2))]
+    )
+
+
+def iter_columnar(file_format, rows, chunk_size=DEFAULT_EXPORT_CHUNK_SIZE):
+    """Yield bytes of Parquet or Arrow IPC file in chunks, each chunk of rows is converted to one
+    record batch (a Parquet row group) so memory does not grow with table size"""
+    schema = columnar_schema()
+    buffer = ExportBuffer()
+    if file_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(buffer, schema)
+    else:
+        writer = pyarrow.ipc.new_file(buffer, schema)
+    for batch in batched(rows, chunk_size):
+        pks, names, balances = zip(*batch)
+        columns = [pa.array([str(pk) for pk in pks]), pa.array(names), pa.array(balances, schema.field("Balance").type)]
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+        yield buffer.take()
+    writer.close()  # footer
+    yield buffer.take()
+
+
+def iter_export(file_format, queryset=None, chunk_size=None):
+    """Yield chunks of accounts export, text for csv & ndjson, bytes for parquet & arrow"""
+    chunk_size = chunk_size or getattr(
+        settings, "ACCOUNTS_EXPORT_CHUNK_SIZE", DEFAULT_EXPORT_CHUNK_SIZE
+    )
+    rows = export_rows(queryset, chunk_size)
+    if file_format in COLUMNAR_EXPORT_FORMATS:
+        return iter_columnar(file_format, rows, chunk_size)
+    if file_format == "csv":
+        return iter_csv(rows, chunk_size)
+    return iter_ndjson(rows, chunk_size)
@@ -0,0 +1,72 @@
+from django import forms
+from django.core import validators
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.functional import cached_property
+from decimal import Decimal, InvalidOperation
+
+CENTS = Decimal("0.01")
+MAX_CENTS = 2**63 - 1  # bigint
+MAX_AMOUNT = Decimal(MAX_CENTS).scaleb(-2)
+
+
+def to_cents(value):
+    """Integer number of cents of amount (Decimal, int or str), rounded to the cent.
+    Raise ValueError if value is not a finite number or does not fit in bigint."""
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(str(value))
+        cents = int(amount.quantize(CENTS).scaleb(2))
+    except (InvalidOperation, ValueError, OverflowError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"Amount out of range: {value!r}")
+    return cents
+
+
+def from_cents(cents):
+    """Decimal amount with 2 decimal places of integer number of cents"""
+    return Decimal(cents).scaleb(-2)
+
+
+class MoneyField(models.BigIntegerField):
+    """Amount of money stored as integer number of cents (bigint), exposed as Decimal with 2 places.
+
+    Exact on every database (no REAL rounding on SQLite), sums are integer additions
+    and it holds balances up to about 92 quadrillion."""
+
+    description = "Amount of money stored as integer cents"
+
+    @cached_property
+    def validators(self):
+        # range of bigint in cents, expressed in the Decimal units the field exposes
+        return [
+            validators.MinValueValidator(-MAX_AMOUNT),
+            validators.MaxValueValidator(MAX_AMOUNT),
+            *self._validators,
+        ]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return from_cents(int(value))  # AVG and some backends return floats or strings
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value)).quantize(CENTS)
+        except InvalidOperation:
+            raise ValidationError(
+                self.error_messages["invalid"], code="invalid", params={"value": value}
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return to_cents(value)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(
+            self, **{"form_class": forms.DecimalField, "decimal_places": 2, **kwargs}
+        )
@@ -1,61 +1,94 @@
 from django import forms
 from django.core.exceptions import ValidationError
-import csv
+from docspert.metrics import span
+from .columnar import COLUMNAR_ERRORS, COLUMNAR_FORMATS, ColumnarSource, detect_columnar
+from .compression import DECOMPRESSION_ERRORS, MAGIC_BYTES, detect_compression
+from .importers import (
+    REQUIRED_HEADERS,
+    ImportMode,
+    iter_csv_records,
+    iter_records,
+    iter_txt_records,
+    open_text_stream,
+    open_upload,
+)
 
 ALLOWED_FILE_TYPE = ["text/csv", "text/plain"]
-REQUIRED_HEADERS = ["ID", "Name", "Balance"]
+COMPRESSION_FORMATS = list(MAGIC_BYTES)
 
 
 class AccountsUploadForm(forms.Form):
     file = forms.FileField(
         label="Select file that contain accounts details.",
     )
+    import_mode = forms.ChoiceField(
+        label="Existing accounts",
+        choices=ImportMode.choices,
+        initial=ImportMode.INSERT,
+        required=False,
+    )
+    background = forms.BooleanField(
+        label="Import in background and track progress.",
+        required=False,
+    )
+
+    def __init__(self, *args, streaming=False, **kwargs):
+        """streaming: if True cleaned file is a generator of records instead of a list,
+        so the file is parsed incrementally while it is being saved."""
+        super().__init__(*args, **kwargs)
+        self.streaming = streaming
 
     def clean_file(self):
+        with span("clean_file"):
+            return self.validate_file()
+
+    def validate_file(self):
+        """Check type & headers of uploaded file. When streaming, records are parsed later while saved.
+        Compressed files are recognized by their content, not by content type sent by the client"""
         uploaded_file = self.cleaned_data["file"]
-        if uploaded_file.content_type not in ALLOWED_FILE_TYPE:
+        columnar_format = detect_columnar(uploaded_file)
+        if columnar_format:
+            return self.open_columnar(uploaded_file, columnar_format)
+        if (
+            uploaded_file.content_type not in ALLOWED_FILE_TYPE
+            and not detect_compression(uploaded_file)
+        ):
             raise ValidationError(
-                f"your are trying to upload unsupported file ext. allowed ext {', '.join(ALLOWED_FILE_TYPE)}."
+                f"your are trying to upload unsupported file ext. allowed ext {', '.join(ALLOWED_FILE_TYPE)} "
+                f"or {', '.join(COMPRESSION_FORMATS)} compressed, {' & '.join(COLUMNAR_FORMATS)} files."
             )
         # Add Content validation
         try:
-            if uploaded_file.content_type == ALLOWED_FILE_TYPE[0]:
-                data = self.convert_csv_to_dict(uploaded_file)
-            elif uploaded_file.content_type == ALLOWED_FILE_TYPE[1]:
-                data = self.convert_txt_to_dict(uploaded_file)
-        except ValidationError:
-            raise ValidationError(
-                f"File is not valid may be empty or not in correct structure, expected structure: {', '.join(REQUIRED_HEADERS)}"
-            )
-        return data
+            stream, content_type = open_upload(uploaded_file, uploaded_file.content_type)
+            try:
+                records = iter_records(stream, content_type)
+            except ValidationError:
+                raise ValidationError(
+                    f"File is not valid may be empty or not in correct structure, expected structure: {', '.join(REQUIRED_HEADERS)}"
+                )
+            if not self.streaming:
+                records = list(records)
+        except DECOMPRESSION_ERRORS:
+            raise ValidationError("Compressed file is corrupted.")
+        return records
+
+    def open_columnar(self, uploaded_file, file_format):
+        """Parquet & Arrow files are recognized by content too, cleaned file is a ColumnarSource
+        whose schema is checked here and batches are read while saved"""
+        try:
+            return ColumnarSource(uploaded_file, file_format)
+        except COLUMNAR_ERRORS:
+            raise ValidationError(f"{file_format.split('-')[0].capitalize()} file is corrupted.")
+
+    def iter_records(self, uploaded_file):
+        """Validate headers of uploaded file and return generator of its records"""
+        stream, content_type = open_upload(uploaded_file, uploaded_file.content_type)
+        return iter_records(stream, content_type)
 
     def convert_csv_to_dict(self, uploaded_file):
         """Responsible of converting csv data to dict to return it to view"""
-        # Decode and parse the file into a dictionary
-        uploaded_file.seek(0)  # Reset file pointer
-        decoded_file = uploaded_file.read().decode("utf-8")
-        reader = csv.DictReader(decoded_file.splitlines())
-        if (
-            reader.fieldnames != REQUIRED_HEADERS
-        ):  # if csv file not containing the required headers, raise ValidationError
-            raise ValidationError("CSV may be empty or not in correct structure.")
-        # Convert headers to lowercase
-        reader.fieldnames = [field.lower() for field in reader.fieldnames]
-        return [row for row in reader]  # Return arr of dict that contain accounts
-    
+        return list(iter_csv_records(open_text_stream(uploaded_file)))
+
     def convert_txt_to_dict(self, uploaded_file):
         """Responsible of converting text data to dict to return it to view"""
-        uploaded_file.seek(0)  # Reset file pointer
-        decoded_file = uploaded_file.read().decode("utf-8")
-        lines = decoded_file.splitlines()
-        if not lines:
-            raise ValidationError("TXT file is empty.")
-        # Assuming the first line contains headers
-        headers = lines[0].split("\t")  # Using tab as the delimiter for TXT
-        if set(headers) != set(REQUIRED_HEADERS):
-            raise ValidationError("TXT does not have the required headers.")
-        # Convert headers to lowercase for consistency
-        headers = [header.lower() for header in headers]
-        return [
-            dict(zip(headers, line.split("\t"))) for line in lines[1:]
-        ]  # Parse rows into a list of dicts
\ No newline at end of file
+        return list(iter_txt_records(open_text_stream(uploaded_file)))
@@ -0,0 +1,520 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from docspert.metrics import span
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from .cache import invalidate_accounts
+from .compression import detect_compression, guess_content_type, open_decompressed, sniff_content_type
+from .fields import CENTS, to_cents
+from .models import Account, ImportMode
+from .search import normalize_name
+import csv
+import datetime
+import io
+import mmap
+import os
+import tempfile
+import uuid
+
+REQUIRED_HEADERS = ["ID", "Name", "Balance"]
+DEFAULT_BATCH_SIZE = 1000
+MMAP_CHUNK_SIZE = 1024 * 1024
+NAME_MAX_LENGTH = Account._meta.get_field("name").max_length
+
+REJECTED_REPORTS_DIR = "imports/rejected/"
+REJECTED_REPORT_HEADERS = ["Row", "ID", "Name", "Balance", "Error"]
+DEFAULT_REJECTED_REPORT_TTL = 7 * 24 * 3600
+
+# How insert mode writes batches:
+# raw: rows converted straight to tuples, multi row INSERT (COPY on PostgreSQL), no model instances
+# orm: Account instances & bulk_create
+IMPORT_LOADERS = ["raw", "orm"]
+DEFAULT_IMPORT_LOADER = "raw"
+
+
+class ChunkedReader(io.RawIOBase):
+    """Expose an iterable of byte chunks (e.g. ``UploadedFile.chunks()``) as a raw binary stream,
+    so it can be wrapped by ``TextIOWrapper`` without reading the whole upload into memory."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0  # EOF
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class ImportStats:
+    """Counters of a single import run"""
+
+    def __init__(self):
+        self.parsed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+
+    def __repr__(self):
+        return (
+            f"ImportStats(parsed={self.parsed}, inserted={self.inserted}, updated={self.updated}, "
+            f"unchanged={self.unchanged}, rejected={self.rejected})"
+        )
+
+
+def map_file(uploaded_file):
+    """Read only memory mapping of uploaded file when it is on local disk (large uploads, stored jobs
+    & chunked uploads), None for in memory uploads, remote storage and empty files"""
+    try:
+        fileno = uploaded_file.fileno()
+        size = os.fstat(fileno).st_size
+    except (AttributeError, OSError):
+        return None
+    if not size:
+        return None  # empty file can't be mapped
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def file_chunks(uploaded_file):
+    """Chunks of uploaded file. Files on local disk are memory mapped,
+    chunks are slices of the mapping instead of copies returned by read()"""
+    mapped = map_file(uploaded_file)
+    if mapped is None:
+        return uploaded_file.chunks()
+    return mmap_chunks(mapped)
+
+
+def mmap_chunks(mapped, chunk_size=MMAP_CHUNK_SIZE):
+    # mapping is not closed explicitly, slices of it may still be referenced by the reader
+    view = memoryview(mapped)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+def open_upload(uploaded_file, content_type=None, name=None):
+    """Return (text stream, content type) of uploaded file, decoded chunk by chunk.
+
+    gzip, zip & zstd files are detected by their magic bytes, whatever content type the client sent,
+    and decompressed while the stream is read. Content type of their content is guessed from file name
+    (e.g. accounts.csv.gz) or from the header line."""
+    compression = detect_compression(uploaded_file)
+    raw = io.BufferedReader(ChunkedReader(file_chunks(uploaded_file)))
+    if compression:
+        raw, inner_name = open_decompressed(uploaded_file, compression, raw)
+        content_type = (
+            guess_content_type(inner_name)
+            or guess_content_type(name or getattr(uploaded_file, "name", None))
+            or sniff_content_type(raw)
+        )
+    return io.TextIOWrapper(raw, encoding="utf-8", newline=""), content_type
+
+
+def open_text_stream(uploaded_file):
+    """Return a text stream that decodes the (decompressed) uploaded file chunk by chunk"""
+    return open_upload(uploaded_file)[0]
+
+
+def iter_csv_records(stream):
+    """Validate csv headers then return generator of dicts (lowercase keys), one per row"""
+    reader = csv.reader(stream)
+    headers = next(reader, None)
+    if (
+        headers != REQUIRED_HEADERS
+    ):  # if csv file not containing the required headers, raise ValidationError
+        raise ValidationError("CSV may be empty or not in correct structure.")
+    headers = [header.lower() for header in headers]
+    return (dict(zip(headers, row)) for row in reader if row)
+
+
+def iter_txt_records(stream):
+    """Validate txt headers then return generator of dicts (lowercase keys), one per row"""
+    first_line = stream.readline()
+    if not first_line:
+        raise ValidationError("TXT file is empty.")
+    # Assuming the first line contains headers
+    headers = first_line.rstrip("\r\n").split("\t")  # Using tab as the delimiter for TXT
+    if set(headers) != set(REQUIRED_HEADERS):
+        raise ValidationError("TXT does not have the required headers.")
+    headers = [header.lower() for header in headers]
+    return (
+        dict(zip(headers, line.rstrip("\r\n").split("\t")))
+        for line in stream
+        if line.strip()
+    )
+
+
+def iter_records(stream, content_type):
+    """Return generator of records using the parser matching the file content type"""
+    if content_type == "text/csv":
+        return iter_csv_records(stream)
+    return iter_txt_records(stream)
+
+
+def convert_record(record):
+    """Convert raw string values of a record into the python types used by Account,
+    raise ValidationError telling which value is wrong"""
+    try:
+        pk, name, balance = record["id"], record["name"], record["balance"]
+    except (KeyError, TypeError):
+        raise ValidationError(f"Missing column in account record: {record}")
+    try:
+        pk = uuid.UUID(pk)
+    except (TypeError, AttributeError, ValueError):
+        raise ValidationError(f"Invalid ID: {pk!r}")
+    if not isinstance(name, str):
+        raise ValidationError(f"Invalid name: {name!r}")
+    if len(name) > NAME_MAX_LENGTH:
+        raise ValidationError(f"Name longer than {NAME_MAX_LENGTH} characters")
+    try:
+        balance = Decimal(balance).quantize(CENTS)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValidationError(f"Invalid balance: {balance!r}")
+    try:
+        to_cents(balance)  # raises ValueError if balance does not fit in the column
+    except ValueError:
+        raise ValidationError(f"Balance out of range: {record['balance']!r}")
+    return {"id": pk, "name": name, "name_normalized": normalize_name(name), "balance": balance}
+
+
+def batched(iterable, size):
+    """Yield lists of at most `size` items from iterable without materializing it"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def convert_records(records, stats, skip_invalid=False, rejected=None):
+    """Validate & convert records lazily in one pass, invalid records raise ValidationError
+    unless skip_invalid is set then they are only counted as rejected.
+
+    Ids already seen in the file are dropped (first row wins), their integers are kept
+    in a set so memory grows by about 100 bytes per row. Rejected rows are added to
+    `rejected` report if given."""
+    seen = set()
+    for record in records:
+        stats.parsed += 1
+        try:
+            account = convert_record(record)
+        except ValidationError as e:
+            if not skip_invalid:
+                raise
+            stats.rejected += 1
+            if rejected is not None:
+                rejected.add(stats.parsed, record, e.messages[0])
+            continue
+        if is_duplicate(account, seen, stats, stats.parsed, record, rejected):
+            continue
+        yield account
+
+
+def is_duplicate(account, seen, stats, row, record, rejected=None):
+    """True when id of converted account is in `seen` ids of the file (counted as rejected and
+    added to `rejected` report), else its id is added to `seen`"""
+    if account["id"].int in seen:
+        stats.rejected += 1
+        if rejected is not None:
+            rejected.add(row, record, "Duplicate ID in file")
+        return True
+    seen.add(account["id"].int)
+    return False
+
+
+class RejectedRows:
+    """CSV report of rejected rows (row number, raw values & reason), spooled to disk
+    when it gets big then saved to default storage under REJECTED_REPORTS_DIR"""
+
+    def __init__(self):
+        self.count = 0
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=1024 * 1024, mode="w+", encoding="utf-8", newline=""
+        )
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(REJECTED_REPORT_HEADERS)
+
+    def add(self, row, record, reason):
+        record = record if isinstance(record, dict) else {}
+        self.writer.writerow(
+            [row, record.get("id", ""), record.get("name", ""), record.get("balance", ""), reason]
+        )
+        self.count += 1
+
+    def save(self):
+        """Store the report, return its id or None when no row was rejected"""
+        if not self.count:
+            self.close()
+            return None
+        report_id = uuid.uuid4()
+        self.file.seek(0)
+        default_storage.save(rejected_report_name(report_id), File(self.file))
+        self.close()
+        return report_id
+
+    def close(self):
+        """Drop the spooled report (temporary file once it got big), safe to call after save"""
+        self.file.close()
+
+
+def rejected_report_name(report_id):
+    return f"{REJECTED_REPORTS_DIR}{report_id}.csv"
+
+
+def delete_expired_reports(max_age=None):
+    """Delete rejected rows reports older than max_age seconds (ACCOUNTS_REJECTED_REPORT_TTL).
+    Return number of deleted reports"""
+    if max_age is None:
+        max_age = getattr(settings, "ACCOUNTS_REJECTED_REPORT_TTL", DEFAULT_REJECTED_REPORT_TTL)
+    expires = timezone.now() - datetime.timedelta(seconds=max_age)
+    try:
+        _, names = default_storage.listdir(REJECTED_REPORTS_DIR)
+    except FileNotFoundError:  # no report saved yet
+        return 0
+    count = 0
+    for name in names:
+        path = f"{REJECTED_REPORTS_DIR}{name}"
+        if default_storage.get_modified_time(path) <= expires:
+            default_storage.delete(path)
+            count += 1
+    return count
+
+
+COPY_TABLE = "accounts_account_import"
+COPY_COLUMNS = ["id", "name", "name_normalized", "balance"]
+
+
+def account_row(record, native_uuid):
+    """Db ready tuple of converted record in COPY_COLUMNS order (uuid in UUIDField format, integer cents)"""
+    return (
+        record["id"] if native_uuid else record["id"].hex,
+        record["name"],
+        record["name_normalized"],
+        to_cents(record["balance"]),  # MoneyField column
+    )
+
+
+def copy_insert_rows(rows):
+    """PostgreSQL: COPY rows into a temporary table then insert the rows whose id is not in
+    accounts table yet, in one statement. Return number of inserted accounts."""
+    table = connection.ops.quote_name(Account._meta.db_table)
+    columns = ", ".join(COPY_COLUMNS)
+    with connection.cursor() as cursor:
+        # temporary table lives as long as the connection (reused from the pool)
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {COPY_TABLE} "
+            f"(LIKE {table} INCLUDING DEFAULTS)"
+        )
+        cursor.execute(f"TRUNCATE {COPY_TABLE}")
+        with cursor.copy(f"COPY {COPY_TABLE} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {COPY_TABLE} "
+            "ON CONFLICT (id) DO NOTHING"
+        )
+        return cursor.rowcount
+
+
+def copy_insert_batch(batch):
+    """PostgreSQL: COPY converted records, see copy_insert_rows"""
+    return copy_insert_rows([account_row(record, True) for record in batch])
+
+
+def insert_rows(rows):
+    """Insert db ready tuples (see account_row) skipping existing ids with multi row INSERT statements
+    (COPY on PostgreSQL). Return number of inserted accounts."""
+    if connection.vendor == "postgresql":
+        return copy_insert_rows(rows)
+    fields = [Account._meta.get_field(column) for column in COPY_COLUMNS]
+    # executemany would run one statement per row, SQLite FTS index flushes its pending terms
+    # at every statement, so rows are sent in as few statements as query parameters limit allows
+    inserted = 0
+    with connection.cursor() as cursor:
+        for chunk in batched(rows, connection.ops.bulk_batch_size(fields, rows)):
+            cursor.execute(insert_sql(fields, len(chunk)), [value for row in chunk for value in row])
+            inserted += cursor.rowcount
+    return inserted
+
+
+def raw_insert_batch(batch):
+    """Insert converted records skipping existing ids without building Account instances,
+    rows are turned into db ready tuples and written by insert_rows. Return number of inserted accounts."""
+    native_uuid = connection.features.has_native_uuid_field
+    return insert_rows([account_row(record, native_uuid) for record in batch])
+
+
+def insert_sql(fields, count):
+    """INSERT statement of `count` rows of fields, rows with an existing id are skipped"""
+    row = "(%s)" % ", ".join(["%s"] * len(fields))
+    return "%s %s (%s) VALUES %s %s" % (
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        connection.ops.quote_name(Account._meta.db_table),
+        ", ".join(connection.ops.quote_name(field.column) for field in fields),
+        ", ".join([row] * count),
+        connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+
+
+def orm_insert_batch(batch):
+    """Insert converted records using Account instances & bulk_create.
+    Return number of inserted accounts."""
+    accounts = [Account(**record) for record in batch]
+    Account.objects.bulk_create(
+        accounts, ignore_conflicts=True
+    )  # ignore confict to not raise error if the same accounts are imported concurrently
+    return len(accounts)
+
+
+def existing_db_ids(values):
+    """Ids already stored among ids given in db format (hex strings on SQLite), returned in the same format.
+    Looked up with SELECT ... IN in chunks the database accepts like in_bulk does, without Account instances"""
+    pk = Account._meta.pk
+    sql = "SELECT %s FROM %s WHERE %s IN (%%s)" % (
+        connection.ops.quote_name(pk.column),
+        connection.ops.quote_name(Account._meta.db_table),
+        connection.ops.quote_name(pk.column),
+    )
+    existing = set()
+    with connection.cursor() as cursor:
+        for chunk in batched(values, connection.ops.bulk_batch_size([pk], values)):
+            cursor.execute(sql % ", ".join(["%s"] * len(chunk)), chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+
+def existing_ids(ids):
+    """Ids (UUID) already stored, see existing_db_ids"""
+    if connection.features.has_native_uuid_field:
+        return existing_db_ids(ids)
+    return {uuid.UUID(value) for value in existing_db_ids([value.hex for value in ids])}
+
+
+def insert_batch(batch, stats):
+    """Insert a batch of converted records, the ones already in database are found by
+    one lookup and never sent to INSERT. Loader is chosen by ACCOUNTS_IMPORT_LOADER setting"""
+    existing = existing_ids([record["id"] for record in batch])
+    new = [record for record in batch if record["id"] not in existing]
+    if not new:
+        inserted = 0
+    elif getattr(settings, "ACCOUNTS_IMPORT_LOADER", DEFAULT_IMPORT_LOADER) == "orm":
+        inserted = orm_insert_batch(new)
+    else:
+        inserted = raw_insert_batch(new)
+    if inserted:
+        invalidate_accounts()  # new accounts may match cached searches
+    stats.inserted += inserted
+    stats.unchanged += len(batch) - inserted
+
+
+def insert_row_batch(rows, stats):
+    """Insert a batch of db ready tuples (see account_row), the ones already in database are found by
+    one lookup and never sent to INSERT. Used by columnar imports, rows never become dicts"""
+    existing = existing_db_ids([row[0] for row in rows])
+    new = [row for row in rows if row[0] not in existing] if existing else rows
+    inserted = insert_rows(new) if new else 0
+    if inserted:
+        invalidate_accounts()
+    stats.inserted += inserted
+    stats.unchanged += len(rows) - inserted
+
+
+def upsert_batch(batch, stats):
+    """Insert new records and update name & balance of existing ones,
+    records equal to what is already stored are not written at all"""
+    records = {record["id"]: record for record in batch}  # last duplicate in batch wins
+    existing = {
+        pk: (name, balance)
+        for pk, name, balance in Account.objects.filter(pk__in=records).values_list(
+            "pk", "name", "balance"
+        )
+    }
+    new, changed = [], []
+    for pk, record in records.items():
+        if pk not in existing:
+            new.append(Account(**record))
+        elif existing[pk] != (record["name"], record["balance"]):
+            changed.append(Account(**record))
+    if connection.features.supports_update_conflicts_with_target:
+        Account.objects.bulk_create(
+            new + changed,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=["name", "name_normalized", "balance"],
+        )
+    else:
+        Account.objects.bulk_create(new, ignore_conflicts=True)
+        Account.objects.bulk_update(changed, ["name", "name_normalized", "balance"])
+    if new or changed:
+        invalidate_accounts([account.pk for account in changed])
+    stats.inserted += len(new)
+    stats.updated += len(changed)
+    stats.unchanged += len(batch) - len(new) - len(changed)
+
+
+def write_batches(
+    accounts,
+    batch_size=None,
+    stats=None,
+    atomic=True,
+    on_batch=None,
+    mode=ImportMode.INSERT,
+    write_batch=None,
+):
+    """Write already converted records using bounded bulk_create batches.
+
+    When atomic the import is all or nothing, otherwise each batch is committed on its own.
+    on_batch(stats) is called after every written batch to report progress.
+    write_batch(batch, stats) replaces the writer chosen by mode."""
+    batch_size = batch_size or getattr(
+        settings, "ACCOUNTS_IMPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE
+    )
+    stats = stats or ImportStats()
+    write_batch = write_batch or (upsert_batch if mode == ImportMode.UPSERT else insert_batch)
+    with transaction.atomic() if atomic else nullcontext():
+        for batch in batched(accounts, batch_size):
+            with transaction.atomic():
+                write_batch(batch, stats)
+            if on_batch:
+                on_batch(stats)
+    return stats
+
+
+def save_accounts(
+    records,
+    batch_size=None,
+    stats=None,
+    skip_invalid=False,
+    on_batch=None,
+    mode=ImportMode.INSERT,
+    rejected=None,
+    atomic=None,
+):
+    """Convert records lazily and write them using bounded bulk_create batches.
+
+    With skip_invalid invalid records are rejected (and written to `rejected` report) instead of
+    aborting the import. Unless atomic is set, the import is all or nothing by default and each
+    batch is committed on its own with skip_invalid."""
+    stats = stats or ImportStats()
+    with span("save_accounts"):
+        return write_batches(
+            convert_records(records, stats, skip_invalid, rejected),
+            batch_size=batch_size,
+            stats=stats,
+            atomic=not skip_invalid if atomic is None else atomic,
+            on_batch=on_batch,
+            mode=mode,
+        )
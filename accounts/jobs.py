@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from .columnar import ColumnarSource, detect_columnar, save_columnar
+from .importers import ImportMode, RejectedRows, iter_records, open_upload, save_accounts
+from .models import ImportJob
+import datetime
+
+DEFAULT_STALE_AFTER = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def enqueue_import(uploaded_file, mode=ImportMode.INSERT):
+    """Store uploaded file on disk and create pending ImportJob for it, return the job"""
+    return ImportJob.objects.create(
+        file=uploaded_file, content_type=uploaded_file.content_type, mode=mode
+    )
+
+
+def claim_next_job():
+    """Mark the oldest pending job, or running job of a worker which stopped sending heartbeats
+    (ACCOUNTS_IMPORT_JOB_STALE_AFTER seconds), as running and return its id or None if there is none.
+    The status is switched with a conditional update so concurrent workers never claim the same job.
+    A job claimed ACCOUNTS_IMPORT_JOB_MAX_ATTEMPTS times already (it keeps killing its worker) fails instead."""
+    stale_after = getattr(settings, "ACCOUNTS_IMPORT_JOB_STALE_AFTER", DEFAULT_STALE_AFTER)
+    max_attempts = getattr(settings, "ACCOUNTS_IMPORT_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    now = timezone.now()
+    claimable = ImportJob.objects.filter(
+        Q(status=ImportJob.Status.PENDING)
+        | Q(status=ImportJob.Status.RUNNING, heartbeat_at__lt=now - datetime.timedelta(seconds=stale_after))
+    ).order_by("created_at")
+    candidates = claimable.values_list("pk", "status", "heartbeat_at", "attempts")[:10]
+    for job_id, status, heartbeat_at, attempts in candidates:
+        unchanged = ImportJob.objects.filter(pk=job_id, status=status, heartbeat_at=heartbeat_at)
+        if attempts >= max_attempts:
+            unchanged.update(
+                status=ImportJob.Status.FAILED,
+                error=f"Worker stopped during each of {attempts} attempts",
+                finished_at=now,
+            )
+            continue
+        claimed = unchanged.update(
+            status=ImportJob.Status.RUNNING, started_at=now, heartbeat_at=now, attempts=attempts + 1
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def delete_finished_job_files():
+    """Delete files of done & failed jobs, nothing reads them anymore. Return number of deleted files"""
+    finished = ImportJob.objects.filter(status__in=[ImportJob.Status.DONE, ImportJob.Status.FAILED]).exclude(file="")
+    count = 0
+    for job in finished.iterator():
+        job.file.delete(save=False)  # missing files are ignored by storage
+        ImportJob.objects.filter(pk=job.pk).update(file="")
+        count += 1
+    return count
+
+
+def close_stale_connections():
+    """Drop connections past CONN_MAX_AGE or broken between jobs, not when the job runs inside
+    a caller's transaction which closing the connection would break"""
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def run_import_job(job_id):
+    """Import the file of a claimed job, progress counters are saved after every batch"""
+    close_stale_connections()
+    job = ImportJob.objects.get(pk=job_id)
+    # updates of a claim taken over as stale (this worker looked dead) are dropped
+    jobs = ImportJob.objects.filter(pk=job_id, started_at=job.started_at)
+
+    def report_progress(stats):
+        jobs.update(
+            heartbeat_at=timezone.now(),
+            rows_parsed=stats.parsed,
+            rows_inserted=stats.inserted,
+            rows_updated=stats.updated,
+            rows_unchanged=stats.unchanged,
+            rows_rejected=stats.rejected,
+        )
+
+    rejected = RejectedRows()
+    try:
+        with job.file.open("rb") as uploaded_file:
+            columnar_format = detect_columnar(uploaded_file)
+            if columnar_format:
+                records, save = ColumnarSource(uploaded_file, columnar_format), save_columnar
+            else:
+                records, save = iter_records(*open_upload(uploaded_file, job.content_type)), save_accounts
+            stats = save(
+                records, skip_invalid=True, on_batch=report_progress, mode=job.mode, rejected=rejected
+            )
+        report_progress(stats)
+        jobs.update(
+            status=ImportJob.Status.DONE, rejected_report=rejected.save(), finished_at=timezone.now()
+        )
+    except Exception as e:
+        jobs.update(
+            status=ImportJob.Status.FAILED, error=str(e), finished_at=timezone.now()
+        )
+    finally:
+        rejected.close()
+        close_stale_connections()
+    return job_id
@@ -0,0 +1,10 @@
+from django.db.models import Q
+from .models import Transfer
+
+
+def account_history(account_id):
+    """Transfers sent or received by account, newest first"""
+    return Transfer.objects.filter(
+        Q(from_account_id=account_id) | Q(to_account_id=account_id)
+    ).order_by("-id")
+
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.importers import batched
+from accounts.services import DatabaseBusy, transfer_batch
+import csv
+
+TRANSFER_HEADERS = ["transfer_from", "transfer_to", "transfer_balance"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply transfers listed in csv file with headers transfer_from,transfer_to,transfer_balance. "
+        "Each batch of rows is applied in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path of transfers csv file.")
+        parser.add_argument(
+            "--batch-size", type=int, default=10000, help="Number of transfers applied per transaction."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            file = open(options["file"], newline="", encoding="utf-8")
+        except OSError as e:
+            raise CommandError(str(e))
+        succeeded = failed = 0
+        with file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != TRANSFER_HEADERS:
+                raise CommandError(f"Expected headers: {','.join(TRANSFER_HEADERS)}")
+            for batch_number, batch in enumerate(batched(reader, options["batch_size"])):
+                offset = batch_number * options["batch_size"]
+                try:
+                    results = transfer_batch(batch)
+                except DatabaseBusy as e:
+                    raise CommandError(f"{e} (applied {succeeded} transfers before line {offset + 2})")
+                for result in results:
+                    if result["status"] == "ok":
+                        succeeded += 1
+                        continue
+                    failed += 1
+                    line = offset + result["index"] + 2  # header is line 1
+                    self.stderr.write(f"Line {line}: {result['error']}")
+        self.stdout.write(self.style.SUCCESS(f"Applied {succeeded} transfers, {failed} failed."))
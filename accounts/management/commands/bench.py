@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.db import connections
+from accounts.bench.scenarios import SCENARIOS, compare_results, host_info, run_benchmarks, same_host
+import json
+import os
+import tempfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark upload, search, list, transfer & import paths on synthetic accounts in a throwaway "
+        "test database, write results as json and fail if any scenario had errors or, on the host of "
+        "the baseline, if throughput regressed compared to it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="10000,100000,1000000", help="Comma separated numbers of generated accounts."
+        )
+        parser.add_argument(
+            "--scenarios", default=",".join(SCENARIOS), help="Comma separated scenarios to run."
+        )
+        parser.add_argument("--output", help="Write results json to this file, stdout if not set.")
+        parser.add_argument("--baseline", help="Results json file to compare results against.")
+        parser.add_argument("--save-baseline", help="Also write results to this file to be used as baseline.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2, help="Allowed ops/sec drop compared to baseline (0.2 = 20%%)."
+        )
+        parser.add_argument(
+            "--errors-only",
+            action="store_true",
+            help="Only fail on errors, report throughput drops without failing (CI on shared runners).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size]
+        except ValueError:
+            raise CommandError("--sizes must be comma separated integers.")
+        scenarios = [name for name in options["scenarios"].split(",") if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}.")
+        baseline, baseline_host = [], None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as file:
+                saved = json.load(file)
+            baseline, baseline_host = saved["results"], saved.get("host")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for alias in connections:
+                # benchmark the real file & journal in a file of its own, not the test suite database
+                if connections[alias].vendor == "sqlite":
+                    connections[alias].settings_dict["TEST"]["NAME"] = os.path.join(tmp, f"bench-{alias}.sqlite3")
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                results = run_benchmarks(sizes, scenarios)
+                host = host_info()
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        output = json.dumps({"host": host, "results": results}, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w", encoding="utf-8") as file:
+                file.write(output)
+
+        # absolute throughput only means something against a baseline of the same machine
+        gate_throughput = bool(baseline) and not options["errors_only"] and same_host(host, baseline_host)
+        if baseline and not gate_throughput:
+            for r in compare_results(results, baseline, options["tolerance"]):
+                if not r.get("errors"):
+                    self.stderr.write(
+                        f"{r['scenario']} ({r['size']} accounts): {r['ops_per_sec']} ops/sec, "
+                        f"baseline {r['baseline_ops_per_sec']} ops/sec (not failing, other host or --errors-only)"
+                    )
+        regressions = compare_results(results, baseline, options["tolerance"], compare_throughput=gate_throughput)
+        for r in regressions:
+            if r.get("errors"):
+                self.stderr.write(f"{r['scenario']} ({r['size']} accounts): {r['errors']} errors")
+            else:
+                self.stderr.write(
+                    f"{r['scenario']} ({r['size']} accounts): {r['ops_per_sec']} ops/sec, "
+                    f"baseline {r['baseline_ops_per_sec']} ops/sec"
+                )
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} benchmark(s) had errors or regressed more than {options['tolerance']:.0%}."
+            )
+        if baseline:
+            self.stderr.write(self.style.SUCCESS("No errors and no regressions compared to baseline."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from accounts.importers import delete_expired_reports
+from accounts.jobs import delete_finished_job_files
+from accounts.uploads import delete_expired_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete chunked upload sessions never finalized, with their spool files, files of finished import jobs "
+        "and old rejected rows reports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age", type=int, help="Age in seconds of deleted sessions, ACCOUNTS_UPLOAD_SESSION_TTL if not set."
+        )
+        parser.add_argument(
+            "--reports-max-age",
+            type=int,
+            help="Age in seconds of deleted rejected rows reports, ACCOUNTS_REJECTED_REPORT_TTL if not set.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = delete_expired_sessions(options["max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired upload sessions."))
+        deleted = delete_finished_job_files()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} files of finished import jobs."))
+        deleted = delete_expired_reports(options["reports_max_age"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired rejected rows reports."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.exporters import COLUMNAR_EXPORT_FORMATS, EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Export all accounts as csv (same structure as uploaded files), ndjson, parquet or arrow, "
+        "streaming rows in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv", help="Export format.")
+        parser.add_argument("--output", help="Output file path, stdout if not set.")
+        parser.add_argument("--chunk-size", type=int, help="Number of rows fetched from database per chunk.")
+
+    def handle(self, *args, **options):
+        binary = options["format"] in COLUMNAR_EXPORT_FORMATS
+        if binary and not options["output"]:
+            raise CommandError(f"--output is required for {options['format']} exports.")
+        chunks = iter_export(options["format"], chunk_size=options["chunk_size"])
+        if not options["output"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        if binary:
+            with open(options["output"], "wb") as file:
+                file.writelines(chunks)
+        else:
+            with open(options["output"], "w", newline="", encoding="utf-8") as file:
+                file.writelines(chunks)
+        self.stderr.write(self.style.SUCCESS(f"Accounts exported to {options['output']}."))
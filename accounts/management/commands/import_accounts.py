@@ -0,0 +1,64 @@
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from accounts.importers import ImportMode, RejectedRows, rejected_report_name
+from accounts.parallel import import_file
+import os
+
+
+class Command(BaseCommand):
+    help = (
+        "Import accounts file (CSV or tab separated TXT), parsing it in parallel worker processes. "
+        "gzip, zip & zstd compressed files are parsed as one stream, Parquet & Arrow files a record batch at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path of accounts file.")
+        parser.add_argument(
+            "--format", choices=["csv", "txt"], help="File format, guessed from file extension if not set."
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Number of parsing processes."
+        )
+        parser.add_argument("--batch-size", type=int, help="Number of rows per insert batch.")
+        parser.add_argument("--shard-size", type=int, help="Bytes of file parsed by one worker task.")
+        parser.add_argument(
+            "--mode",
+            choices=ImportMode.values,
+            default=ImportMode.INSERT,
+            help="insert: only add new accounts, upsert: also update name & balance of existing accounts.",
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Reject invalid rows and keep importing instead of aborting the whole import, "
+            "rejected rows are saved in a CSV report.",
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options["file"]):
+            raise CommandError(f"File {options['file']} does not exist.")
+        rejected = RejectedRows()
+        try:
+            stats = import_file(
+                options["file"],
+                file_format=options["format"],
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                shard_size=options["shard_size"],
+                skip_invalid=options["skip_invalid"],
+                mode=options["mode"],
+                rejected=rejected,
+            )
+        except ValidationError as e:
+            rejected.close()
+            raise CommandError(e.messages[0])
+        report_id = rejected.save()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Parsed {stats.parsed} rows, inserted {stats.inserted}, updated {stats.updated}, "
+                f"unchanged {stats.unchanged}, rejected {stats.rejected}."
+            )
+        )
+        if report_id:
+            self.stdout.write(f"Rejected rows report: {default_storage.path(rejected_report_name(report_id))}")
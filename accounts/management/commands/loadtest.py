@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from accounts.bench.http import run_load
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent GET requests to running server and report requests/sec and latency percentiles, "
+        "used to compare WSGI & ASGI deployments of the same endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Full urls requested in turn.")
+        parser.add_argument("--requests", type=int, default=1000, help="Total number of requests.")
+        parser.add_argument("--concurrency", type=int, default=10, help="Number of concurrent clients.")
+        parser.add_argument("--timeout", type=float, default=30, help="Timeout of one request in seconds.")
+
+    def handle(self, *args, **options):
+        result = run_load(
+            options["urls"],
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            timeout=options["timeout"],
+        )
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,54 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.core.management.base import BaseCommand
+from django.db import connections
+from accounts.jobs import claim_next_job, run_import_job
+import django
+import time
+
+
+def setup_worker_process():
+    """Make sure django is ready inside spawned worker processes"""
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = "Run worker that imports pending uploaded account files (ImportJob) using a pool of workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of jobs imported concurrently, default SQLite database allows only one writer at a time.",
+        )
+        parser.add_argument(
+            "--processes", action="store_true", help="Use a process pool instead of a thread pool."
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0, help="Seconds to wait before checking for new jobs."
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when there is no pending or running job."
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options["workers"], 1)
+        if options["processes"]:
+            connections.close_all()  # connections must not be shared with forked processes
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=setup_worker_process)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        running = set()
+        with executor:
+            while True:
+                while len(running) < workers and (job_id := claim_next_job()):
+                    self.stdout.write(f"Importing job {job_id}")
+                    running.add(executor.submit(run_import_job, job_id))
+                if not running:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                done, running = wait(running, timeout=options["poll_interval"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.stdout.write(self.style.SUCCESS(f"Finished job {future.result()}"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='mode',
+            field=models.CharField(choices=[('insert', 'Insert new accounts only'), ('upsert', 'Insert new and update existing accounts')], default='insert', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_unchanged',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='rows_updated',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
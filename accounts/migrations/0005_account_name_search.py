@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:58
+
+from django.db import migrations, models
+# Search index as this migration created it, copied here so later changes of accounts.search
+# don't change what the migration does
+FTS_TABLE = "accounts_account_fts"
+
+SQLITE_SEARCH_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name_normalized, account_id UNINDEXED, tokenize='trigram')",
+    f"DELETE FROM {FTS_TABLE}",
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "SELECT rowid, name_normalized, id FROM accounts_account",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_insert AFTER INSERT ON accounts_account BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "VALUES (new.rowid, new.name_normalized, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_delete AFTER DELETE ON accounts_account BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_update AFTER UPDATE OF name_normalized "
+    "ON accounts_account BEGIN "
+    f"UPDATE {FTS_TABLE} SET name_normalized = new.name_normalized WHERE rowid = old.rowid; END",
+]
+
+POSTGRES_SEARCH_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS accounts_account_name_trgm_idx "
+    "ON accounts_account USING gin (name_normalized gin_trgm_ops)",
+]
+
+
+def install_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                return  # search falls back to LIKE scans
+        statements = SQLITE_SEARCH_INDEX_SQL
+    elif vendor == "postgresql":
+        statements = POSTGRES_SEARCH_INDEX_SQL
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def normalize_name(name):
+    return " ".join(name.split()).lower()
+
+
+def fill_name_normalized(apps, schema_editor):
+    Account = apps.get_model("accounts", "Account")
+    accounts = []
+    for account in Account.objects.only("id", "name").iterator(chunk_size=2000):
+        account.name_normalized = normalize_name(account.name)
+        accounts.append(account)
+        if len(accounts) == 2000:
+            Account.objects.bulk_update(accounts, ["name_normalized"])
+            accounts = []
+    Account.objects.bulk_update(accounts, ["name_normalized"])
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for trigger in ["insert", "update", "delete"]:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS accounts_account_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS accounts_account_fts")
+    elif schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS accounts_account_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_transfer_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='name_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_name_normalized, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_account_name_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['name', 'id'], name='account_name_id_idx'),
+        ),
+    ]
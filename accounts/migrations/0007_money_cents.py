@@ -0,0 +1,124 @@
+import accounts.fields
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+# (model, decimal field) converted to integer cents
+MONEY_FIELDS = [
+    ("account", "balance"),
+    ("transfer", "amount"),
+    ("balancesnapshot", "balance"),
+]
+
+
+def decimal_to_cents(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model("accounts", model_name)
+        # one UPDATE per table, ROUND guards against REAL values (10.29 * 100 = 1028.9999...) on SQLite
+        model.objects.update(
+            **{f"{field}_cents": Cast(Round(F(field) * 100), models.BigIntegerField())}
+        )
+
+
+def cents_to_decimal(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model("accounts", model_name)
+        rows = model.objects.values_list("pk", f"{field}_cents").iterator(chunk_size=2000)
+        for pk, cents in rows:
+            model.objects.filter(pk=pk).update(**{field: accounts.fields.from_cents(cents)})
+
+
+# Search index as this migration created it, copied here so later changes of accounts.search
+# don't change what the migration does
+FTS_TABLE = "accounts_account_fts"
+
+SQLITE_SEARCH_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name_normalized, account_id UNINDEXED, tokenize='trigram')",
+    f"DELETE FROM {FTS_TABLE}",
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "SELECT rowid, name_normalized, id FROM accounts_account",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_insert AFTER INSERT ON accounts_account BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "VALUES (new.rowid, new.name_normalized, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_delete AFTER DELETE ON accounts_account BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER IF NOT EXISTS accounts_account_fts_update AFTER UPDATE OF name_normalized "
+    "ON accounts_account BEGIN "
+    f"UPDATE {FTS_TABLE} SET name_normalized = new.name_normalized WHERE rowid = old.rowid; END",
+]
+
+POSTGRES_SEARCH_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS accounts_account_name_trgm_idx "
+    "ON accounts_account USING gin (name_normalized gin_trgm_ops)",
+]
+
+
+def install_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                return  # search falls back to LIKE scans
+        statements = SQLITE_SEARCH_INDEX_SQL
+    elif vendor == "postgresql":
+        statements = POSTGRES_SEARCH_INDEX_SQL
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    # SQLite table remakes below drop the triggers of the search index and may change rowids
+    install_search_index(schema_editor)
+
+
+def money_operations(model_name, field):
+    return [
+        # nullable so the column can be dropped & re-added without a default when reversing
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name=model_name,
+            name=f"{field}_cents",
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
+
+
+def swap_operations(model_name, field):
+    return [
+        migrations.RemoveField(model_name=model_name, name=field),
+        migrations.RenameField(model_name=model_name, old_name=f"{field}_cents", new_name=field),
+        migrations.AlterField(
+            model_name=model_name,
+            name=field,
+            field=accounts.fields.MoneyField(),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_account_name_id_idx'),
+    ]
+
+    operations = [
+        # runs last when migrating backwards
+        migrations.RunPython(migrations.RunPython.noop, create_search_index),
+        *[operation for model_name, field in MONEY_FIELDS for operation in money_operations(model_name, field)],
+        migrations.RunPython(decimal_to_cents, cents_to_decimal),
+        *[operation for model_name, field in MONEY_FIELDS for operation in swap_operations(model_name, field)],
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['balance', 'id'], name='account_balance_id_idx'),
+        ),
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_money_cents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rejected_report',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
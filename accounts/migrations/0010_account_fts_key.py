@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations
+# Search index SQL copied here so later changes of accounts.search don't change what the migration does
+FTS_TABLE = "accounts_account_fts"
+FTS_KEY_TABLE = "accounts_account_fts_key"
+FTS_TRIGGERS = ["accounts_account_fts_insert", "accounts_account_fts_delete", "accounts_account_fts_update"]
+FTS_ROWID = f"(SELECT fts_rowid FROM {FTS_KEY_TABLE} WHERE account_id = %s)"
+
+# fts rows keyed on account id through the key table
+KEYED_SEARCH_INDEX_SQL = [
+    *[f"DROP TRIGGER IF EXISTS {trigger}" for trigger in FTS_TRIGGERS],
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name_normalized, account_id UNINDEXED, tokenize='trigram')",
+    f"CREATE TABLE IF NOT EXISTS {FTS_KEY_TABLE} ("
+    "fts_rowid integer NOT NULL PRIMARY KEY, account_id char(32) NOT NULL UNIQUE)",
+    f"DELETE FROM {FTS_TABLE}",
+    f"DELETE FROM {FTS_KEY_TABLE}",
+    f"INSERT INTO {FTS_KEY_TABLE}(account_id) SELECT id FROM accounts_account",
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    f"SELECT k.fts_rowid, a.name_normalized, a.id FROM accounts_account a "
+    f"JOIN {FTS_KEY_TABLE} k ON k.account_id = a.id",
+    "CREATE TRIGGER accounts_account_fts_insert AFTER INSERT ON accounts_account BEGIN "
+    f"INSERT INTO {FTS_KEY_TABLE}(account_id) VALUES (new.id); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    f"VALUES ({FTS_ROWID % 'new.id'}, new.name_normalized, new.id); END",
+    "CREATE TRIGGER accounts_account_fts_delete AFTER DELETE ON accounts_account BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = {FTS_ROWID % 'old.id'}; "
+    f"DELETE FROM {FTS_KEY_TABLE} WHERE account_id = old.id; END",
+    "CREATE TRIGGER accounts_account_fts_update AFTER UPDATE OF id, name_normalized "
+    "ON accounts_account BEGIN "
+    f"UPDATE {FTS_TABLE} SET name_normalized = new.name_normalized, account_id = new.id "
+    f"WHERE rowid = {FTS_ROWID % 'old.id'}; "
+    f"UPDATE {FTS_KEY_TABLE} SET account_id = new.id WHERE account_id = old.id; END",
+]
+
+# fts rows keyed on accounts_account rowid, as created by 0005 & 0007
+ROWID_SEARCH_INDEX_SQL = [
+    *[f"DROP TRIGGER IF EXISTS {trigger}" for trigger in FTS_TRIGGERS],
+    f"DROP TABLE IF EXISTS {FTS_KEY_TABLE}",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name_normalized, account_id UNINDEXED, tokenize='trigram')",
+    f"DELETE FROM {FTS_TABLE}",
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "SELECT rowid, name_normalized, id FROM accounts_account",
+    "CREATE TRIGGER accounts_account_fts_insert AFTER INSERT ON accounts_account BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    "VALUES (new.rowid, new.name_normalized, new.id); END",
+    "CREATE TRIGGER accounts_account_fts_delete AFTER DELETE ON accounts_account BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER accounts_account_fts_update AFTER UPDATE OF name_normalized "
+    "ON accounts_account BEGIN "
+    f"UPDATE {FTS_TABLE} SET name_normalized = new.name_normalized WHERE rowid = old.rowid; END",
+]
+
+
+def run_sqlite_statements(schema_editor, statements):
+    if schema_editor.connection.vendor != "sqlite":
+        return  # PostgreSQL trigram index has no triggers
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+            return  # search falls back to LIKE scans
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def key_search_index(apps, schema_editor):
+    run_sqlite_statements(schema_editor, KEYED_SEARCH_INDEX_SQL)
+
+
+def unkey_search_index(apps, schema_editor):
+    run_sqlite_statements(schema_editor, ROWID_SEARCH_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_upload_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(key_search_index, unkey_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_account_fts_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadchunk',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadchunk',
+            name='received',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='client',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
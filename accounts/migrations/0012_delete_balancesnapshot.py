@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_upload_chunk_claim'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BalanceSnapshot',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # jobs running before heartbeats existed, stale once started_at is old enough
+    ImportJob = apps.get_model("accounts", "ImportJob")
+    ImportJob.objects.filter(status="running").update(heartbeat_at=F("started_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_delete_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
 from django.db import models
+from django.urls import reverse
+from django.utils import timezone
+from .fields import MoneyField
+from .search import normalize_name
 import uuid
 
 # Create your models here.
@@ -7,7 +11,170 @@ import uuid
 class Account(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
-    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    # lowercased name, indexed for prefix search & source of full text search index
+    name_normalized = models.CharField(max_length=255, db_index=True, editable=False, default="")
+    balance = MoneyField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "id"], name="account_name_id_idx"),  # keyset pagination
+            models.Index(fields=["balance", "id"], name="account_balance_id_idx"),  # top accounts report
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.balance}"
+
+    def save(self, *args, **kwargs):
+        self.name_normalized = normalize_name(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "name_normalized"}
+        super().save(*args, **kwargs)
+
+
+class ImportMode(models.TextChoices):
+    """insert: only add new accounts, upsert: also update name & balance of existing accounts"""
+
+    INSERT = "insert", "Insert new accounts only"
+    UPSERT = "upsert", "Insert new and update existing accounts"
+
+
+class ImportJob(models.Model):
+    """Uploaded accounts file waiting to be imported by `manage.py process_imports` worker"""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to="imports/")
+    content_type = models.CharField(max_length=100)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    mode = models.CharField(
+        max_length=10, choices=ImportMode.choices, default=ImportMode.INSERT
+    )
+    rows_parsed = models.PositiveBigIntegerField(default=0)
+    rows_inserted = models.PositiveBigIntegerField(default=0)
+    rows_updated = models.PositiveBigIntegerField(default=0)
+    rows_unchanged = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+    # id of csv report of rejected rows, see accounts.importers.RejectedRows
+    rejected_report = models.UUIDField(null=True, blank=True, editable=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # saved by the worker after every batch, running jobs without recent heartbeat are claimed again
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.file.name} - {self.status}"
+
+    @property
+    def throughput(self):
+        """Parsed rows per second since the job started"""
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_parsed / elapsed, 2) if elapsed > 0 else 0
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows_parsed": self.rows_parsed,
+            "mode": self.mode,
+            "rows_inserted": self.rows_inserted,
+            "rows_updated": self.rows_updated,
+            "rows_unchanged": self.rows_unchanged,
+            "rows_rejected": self.rows_rejected,
+            "rejected_report_url": (
+                reverse("rejected_rows_report", args=[self.rejected_report]) if self.rejected_report else None
+            ),
+            "throughput": self.throughput,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class Transfer(models.Model):
+    """Append only journal of balance movements between accounts"""
+
+    from_account = models.ForeignKey(
+        Account, on_delete=models.PROTECT, related_name="outgoing_transfers", db_index=False
+    )
+    to_account = models.ForeignKey(
+        Account, on_delete=models.PROTECT, related_name="incoming_transfers", db_index=False
+    )
+    amount = MoneyField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # (account, id) indexes serve per account history, newest first
+        indexes = [
+            models.Index(fields=["from_account", "id"], name="transfer_from_id_idx"),
+            models.Index(fields=["to_account", "id"], name="transfer_to_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.from_account_id} -> {self.to_account_id}: {self.amount}"
+
+
+class UploadSession(models.Model):
+    """Accounts file uploaded in numbered chunks (see accounts.uploads), imported by an ImportJob once finalized"""
+
+    class Status(models.TextChoices):
+        OPEN = "open", "Open"
+        FINALIZED = "finalized", "Finalized"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    mode = models.CharField(max_length=10, choices=ImportMode.choices, default=ImportMode.INSERT)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.OPEN)
+    import_job = models.OneToOneField(ImportJob, on_delete=models.SET_NULL, null=True, blank=True)
+    # address of client which created it, open sessions per client are capped
+    client = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_name} - {self.status}"
+
+    @property
+    def chunk_count(self):
+        return max(-(-self.total_size // self.chunk_size), 1)  # ceil, an empty file is one empty chunk
+
+    def expected_chunk_size(self, index):
+        """Every chunk is chunk_size bytes except the last one"""
+        if index == self.chunk_count - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+
+class UploadChunk(models.Model):
+    """Chunk of upload session written to its spool file, sha256 is the checksum verified on receipt.
+    Not received while it is copied to the spool file, since claimed_at"""
+
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.BooleanField(default=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["session", "index"], name="upload_chunk_session_index_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} #{self.index}"
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.db.models import Q
+import base64
+import json
+import uuid
+
+DEFAULT_PAGE_SIZE = 30
+DEFAULT_PAGE_SIZE_MAX = 100
+
+
+def encode_cursor(name, pk, rank=None):
+    """Opaque cursor pointing right after account (name, pk), or (rank, name, pk) of ranked pages"""
+    key = [name, str(pk)] if rank is None else [name, str(pk), rank]
+    data = json.dumps(key).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor, ranked=False):
+    """Return (name, pk, rank) encoded in cursor (rank is None unless ranked),
+    raise ValueError if cursor is not valid"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if ranked:
+            name, pk, rank = key
+            return str(name), uuid.UUID(pk), int(rank)
+        name, pk = key
+        return str(name), uuid.UUID(pk), None
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def get_page_size(request):
+    """Page size requested using page_size query parameter, capped by ACCOUNTS_PAGE_SIZE_MAX"""
+    default = getattr(settings, "ACCOUNTS_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, "ACCOUNTS_PAGE_SIZE_MAX", DEFAULT_PAGE_SIZE_MAX)
+    try:
+        page_size = int(request.GET.get("page_size", default))
+    except ValueError:
+        page_size = default
+    return min(max(page_size, 1), maximum)
+
+
+def keyset_queryset(queryset, cursor, page_size, rank=None):
+    """Queryset of accounts ordered by (name, id) starting after cursor, with one extra row
+    telling whether a next page exists.
+
+    Rows after the cursor are found with a range on the (name, id) index instead of OFFSET,
+    so every page costs the same as the first one. Works with model and values() querysets.
+    With a rank expression (e.g. search_rank) rows are ordered by (rank, name, id) instead
+    and the rank of the last row is part of the cursor."""
+    if rank is not None:
+        queryset = queryset.annotate(rank=rank).order_by("rank", "name", "id")
+    else:
+        queryset = queryset.order_by("name", "id")
+    if cursor:
+        name, pk, last_rank = decode_cursor(cursor, ranked=rank is not None)
+        after = Q(name__gt=name) | Q(name=name, id__gt=pk)
+        if rank is not None:
+            queryset = queryset.filter(Q(rank__gt=last_rank) | Q(after, rank=last_rank))
+        else:
+            # name >= x narrows index range, the OR only breaks ties between equal names
+            queryset = queryset.filter(name__gte=name).filter(Q(name__gt=name) | Q(id__gt=pk))
+    return queryset[: page_size + 1]
+
+
+def keyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, rank=None):
+    """Return (rows, next_cursor) of page of accounts starting after cursor"""
+    return page_result(list(keyset_queryset(queryset, cursor, page_size, rank)), page_size)
+
+
+async def akeyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, rank=None):
+    """Async version of keyset_page"""
+    rows = [row async for row in keyset_queryset(queryset, cursor, page_size, rank)]
+    return page_result(rows, page_size)
+
+
+def page_result(rows, page_size):
+    # rank annotation is only needed by the cursor, not returned in values() rows
+    ranks = [row.pop("rank", None) if isinstance(row, dict) else getattr(row, "rank", None) for row in rows]
+    if len(rows) <= page_size:
+        return rows, None
+    last = rows[page_size - 1]
+    rank = ranks[page_size - 1]
+    if isinstance(last, dict):
+        return rows[:page_size], encode_cursor(last["name"], last["id"], rank)
+    return rows[:page_size], encode_cursor(last.name, last.pk, rank)
@@ -0,0 +1,177 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from .columnar import COLUMNAR_ERRORS, ColumnarSource, detect_columnar, save_columnar
+from .compression import DECOMPRESSION_ERRORS, detect_compression
+from .importers import (
+    REQUIRED_HEADERS,
+    ImportMode,
+    ImportStats,
+    convert_record,
+    is_duplicate,
+    iter_records,
+    open_upload,
+    save_accounts,
+    write_batches,
+)
+import csv
+import django
+import io
+import os
+
+DEFAULT_SHARD_SIZE = 8 * 1024 * 1024  # bytes of file parsed by one worker task
+
+
+def read_headers(path, file_format):
+    """Validate header line of the file, return lowercase headers and offset of the first row.
+    Rows are parsed line by line in shards, so csv fields must not contain new lines."""
+    with open(path, "rb") as file:
+        first_line = file.readline()
+        offset = file.tell()
+    line = first_line.decode("utf-8").rstrip("\r\n")
+    if file_format == "csv":
+        headers = next(csv.reader([line]), [])
+        if headers != REQUIRED_HEADERS:
+            raise ValidationError("CSV may be empty or not in correct structure.")
+    else:
+        headers = line.split("\t")
+        if set(headers) != set(REQUIRED_HEADERS):
+            raise ValidationError("TXT does not have the required headers.")
+    return [header.lower() for header in headers], offset
+
+
+def find_shards(path, start, shard_size=DEFAULT_SHARD_SIZE):
+    """Split file from start offset into (start, end) byte ranges, each end is aligned on a new line"""
+    file_size = os.path.getsize(path)
+    shards = []
+    with open(path, "rb") as file:
+        while start < file_size:
+            file.seek(min(start + shard_size, file_size))
+            file.readline()  # move to the end of the current line
+            end = min(file.tell(), file_size)
+            shards.append((start, end))
+            start = end
+    return shards
+
+
+def parse_shard(path, start, end, file_format, headers):
+    """Parse and validate rows in byte range of the file, runs inside worker process.
+    Return converted records and (row number in shard, raw record, error message) of the rejected ones."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    if file_format == "csv":
+        rows = csv.reader(io.StringIO(text, newline=""))
+    else:
+        rows = (line.split("\t") for line in text.splitlines())
+    records, rejected = [], []
+    for row in rows:
+        if not row or row == [""]:
+            continue  # skip empty lines
+        record = dict(zip(headers, row))
+        try:
+            records.append(convert_record(record))
+        except ValidationError as e:
+            rejected.append((len(records) + len(rejected) + 1, record, e.messages[0]))
+    return records, rejected
+
+
+def parse_shards(path, shards, file_format, headers, workers):
+    """Yield parse_shard results in file order, at most 2 shards per worker are in flight
+    so memory is bounded whatever the file size is."""
+    if workers <= 1:
+        for start, end in shards:
+            yield parse_shard(path, start, end, file_format, headers)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as executor:
+        pending = deque()
+        for start, end in shards:
+            pending.append(executor.submit(parse_shard, path, start, end, file_format, headers))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def import_file(
+    path,
+    file_format=None,
+    workers=None,
+    batch_size=None,
+    shard_size=None,
+    skip_invalid=False,
+    mode=ImportMode.INSERT,
+    rejected=None,
+):
+    """Import accounts file, parsing and validating it in parallel using a process pool,
+    then write the converted records using bounded bulk_create batches. Return ImportStats.
+    gzip, zip & zstd files are decompressed and parsed while read by this process,
+    Parquet & Arrow files are converted a record batch at a time by this process too.
+    Like save_accounts, ids repeated in the file are dropped and rejected rows go to `rejected` report."""
+    with open(path, "rb") as file:
+        if detect_columnar(file):
+            return import_columnar_file(path, batch_size, skip_invalid, mode, rejected)
+        if detect_compression(file):
+            return import_compressed_file(path, file_format, batch_size, skip_invalid, mode, rejected)
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "txt")
+    workers = workers or os.cpu_count() or 1
+    headers, offset = read_headers(path, file_format)
+    shards = find_shards(path, offset, shard_size or DEFAULT_SHARD_SIZE)
+    stats = ImportStats()
+
+    def converted_records():
+        # shards come back in file order, rows are numbered and ids deduplicated here as in convert_records
+        seen = set()
+        for records, invalid in parse_shards(path, shards, file_format, headers, workers):
+            if invalid and not skip_invalid:
+                raise ValidationError(invalid[0][2])
+            first_row = stats.parsed
+            stats.parsed += len(records) + len(invalid)
+            stats.rejected += len(invalid)
+            if rejected is not None:
+                for row, record, reason in invalid:
+                    rejected.add(first_row + row, record, reason)
+            invalid_rows = {row for row, _, _ in invalid}
+            rows = (row for row in range(1, len(records) + len(invalid) + 1) if row not in invalid_rows)
+            for row, account in zip(rows, records):
+                if not is_duplicate(account, seen, stats, first_row + row, account, rejected):
+                    yield account
+
+    return write_batches(
+        converted_records(),
+        batch_size=batch_size,
+        stats=stats,
+        atomic=not skip_invalid,
+        mode=mode,
+    )
+
+
+def import_compressed_file(
+    path, file_format=None, batch_size=None, skip_invalid=False, mode=ImportMode.INSERT, rejected=None
+):
+    """Import compressed accounts file as one stream, compressed data can't be split in byte ranges
+    parsed by separate workers"""
+    content_type = {"csv": "text/csv", "txt": "text/plain"}.get(file_format)
+    with open(path, "rb") as file:
+        stream, content_type = open_upload(File(file), content_type)
+        try:
+            records = iter_records(stream, content_type)
+            return save_accounts(
+                records, batch_size=batch_size, skip_invalid=skip_invalid, mode=mode, rejected=rejected
+            )
+        except DECOMPRESSION_ERRORS as e:
+            raise ValidationError(f"Compressed file is corrupted: {e}")
+
+
+def import_columnar_file(path, batch_size=None, skip_invalid=False, mode=ImportMode.INSERT, rejected=None):
+    """Import Parquet or Arrow file, its columns are already parsed so conversion is vectorized
+    instead of being spread on worker processes"""
+    with open(path, "rb") as file:
+        try:
+            source = ColumnarSource(File(file), detect_columnar(file))
+            return save_columnar(
+                source, batch_size=batch_size, skip_invalid=skip_invalid, mode=mode, rejected=rejected
+            )
+        except COLUMNAR_ERRORS as e:
+            raise ValidationError(f"Columnar file is corrupted: {e}")
@@ -0,0 +1,60 @@
+from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, Max, Min, Sum
+from decimal import Decimal
+from .fields import CENTS, from_cents, to_cents
+from .models import Account
+
+DEFAULT_BUCKETS = 10
+MAX_BUCKETS = 100
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+
+def balance_summary(queryset=None):
+    """Number of accounts, total, average, min & max balance computed by one aggregate query"""
+    queryset = Account.objects.all() if queryset is None else queryset
+    result = queryset.aggregate(
+        accounts=Count("id"),
+        total=Sum("balance"),
+        minimum=Min("balance"),
+        maximum=Max("balance"),
+    )
+    total = result["total"] or Decimal("0.00")
+    # exact decimal average from integer total, AVG() would return a float
+    average = (total / result["accounts"]).quantize(CENTS) if result["accounts"] else Decimal("0.00")
+    return {**result, "total": total, "average": average}
+
+
+def balance_histogram(buckets=DEFAULT_BUCKETS, queryset=None):
+    """Split [min, max] balance range in equal width buckets and count accounts of each one,
+    counting is a GROUP BY on integer division of balance cents done by the database."""
+    queryset = Account.objects.all() if queryset is None else queryset
+    bounds = queryset.aggregate(minimum=Min("balance"), maximum=Max("balance"))
+    if bounds["minimum"] is None:
+        return []
+    low, high = to_cents(bounds["minimum"]), to_cents(bounds["maximum"])
+    width = (high - low) // buckets + 1  # rounded up so max balance falls in the last bucket
+    # balance column holds cents, integer division gives bucket index
+    bucket = ExpressionWrapper((F("balance") - low) / width, output_field=BigIntegerField())
+    counts = dict(
+        queryset.order_by()
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(count=Count("id"))
+        .values_list("bucket", "count")
+    )
+    return [
+        {
+            "from": from_cents(low + index * width),
+            "to": from_cents(min(low + (index + 1) * width - 1, high)),
+            "count": counts.get(index, 0),
+        }
+        for index in range(buckets)
+        if low + index * width <= high
+    ]
+
+
+def top_accounts(limit=DEFAULT_TOP, lowest=False, queryset=None):
+    """Accounts with highest (or lowest) balances, read from (balance, id) index"""
+    queryset = Account.objects.all() if queryset is None else queryset
+    ordering = ["balance", "id"] if lowest else ["-balance", "-id"]
+    return list(queryset.order_by(*ordering).values("id", "name", "balance")[:limit])
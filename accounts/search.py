@@ -0,0 +1,124 @@
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "accounts_account_fts"
+TRIGRAM_MIN_LENGTH = 3  # fts5 trigram tokenizer and pg_trgm can not match shorter queries
+
+FTS_KEY_TABLE = "accounts_account_fts_key"
+FTS_TRIGGERS = ["accounts_account_fts_insert", "accounts_account_fts_delete", "accounts_account_fts_update"]
+# fts rowid of an account is looked up by its id in the key table, accounts_account implicit rowid
+# is not stable (VACUUM, table remakes by migrations) so triggers never use it
+FTS_ROWID = f"(SELECT fts_rowid FROM {FTS_KEY_TABLE} WHERE account_id = %s)"
+
+SQLITE_SEARCH_INDEX_SQL = [
+    *[f"DROP TRIGGER IF EXISTS {trigger}" for trigger in FTS_TRIGGERS],
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name_normalized, account_id UNINDEXED, tokenize='trigram')",
+    f"CREATE TABLE IF NOT EXISTS {FTS_KEY_TABLE} ("
+    "fts_rowid integer NOT NULL PRIMARY KEY, account_id char(32) NOT NULL UNIQUE)",
+    f"DELETE FROM {FTS_TABLE}",
+    f"DELETE FROM {FTS_KEY_TABLE}",
+    f"INSERT INTO {FTS_KEY_TABLE}(account_id) SELECT id FROM accounts_account",
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    f"SELECT k.fts_rowid, a.name_normalized, a.id FROM accounts_account a "
+    f"JOIN {FTS_KEY_TABLE} k ON k.account_id = a.id",
+    "CREATE TRIGGER accounts_account_fts_insert AFTER INSERT ON accounts_account BEGIN "
+    f"INSERT INTO {FTS_KEY_TABLE}(account_id) VALUES (new.id); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name_normalized, account_id) "
+    f"VALUES ({FTS_ROWID % 'new.id'}, new.name_normalized, new.id); END",
+    "CREATE TRIGGER accounts_account_fts_delete AFTER DELETE ON accounts_account BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = {FTS_ROWID % 'old.id'}; "
+    f"DELETE FROM {FTS_KEY_TABLE} WHERE account_id = old.id; END",
+    "CREATE TRIGGER accounts_account_fts_update AFTER UPDATE OF id, name_normalized "
+    "ON accounts_account BEGIN "
+    f"UPDATE {FTS_TABLE} SET name_normalized = new.name_normalized, account_id = new.id "
+    f"WHERE rowid = {FTS_ROWID % 'old.id'}; "
+    f"UPDATE {FTS_KEY_TABLE} SET account_id = new.id WHERE account_id = old.id; END",
+]
+
+POSTGRES_SEARCH_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS accounts_account_name_trgm_idx "
+    "ON accounts_account USING gin (name_normalized gin_trgm_ops)",
+]
+
+
+def normalize_name(name):
+    """Normalized form of account name stored in name_normalized and used for searching"""
+    return " ".join(name.split()).lower()
+
+
+def install_search_index(db_connection):
+    """Create (or rebuild) name search index: fts5 trigram table kept in sync by triggers on SQLite,
+    trigram gin index on PostgreSQL. SQLite table remakes by migrations drop the triggers,
+    reinstall_missing_triggers puts them back after migrate."""
+    if db_connection.vendor == "sqlite":
+        with db_connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+                return  # search falls back to LIKE scans
+        statements = SQLITE_SEARCH_INDEX_SQL
+    elif db_connection.vendor == "postgresql":
+        statements = POSTGRES_SEARCH_INDEX_SQL
+    else:
+        return
+    with transaction.atomic(using=db_connection.alias), db_connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def reinstall_missing_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate receiver: rebuild SQLite search index when a migration remade accounts table
+    (which drops its triggers), the index would silently stop following account changes otherwise"""
+    db_connection = connections[using]
+    if db_connection.vendor != "sqlite":
+        return
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s) OR (type = 'trigger' AND tbl_name = %s)",
+            [FTS_TABLE, FTS_KEY_TABLE, "accounts_account"],
+        )
+        names = {row[0] for row in cursor.fetchall()}
+    if {FTS_TABLE, FTS_KEY_TABLE} <= names and not set(FTS_TRIGGERS) <= names:
+        install_search_index(db_connection)
+
+
+def has_fts_index():
+    if connection.vendor != "sqlite":
+        return False
+    if not hasattr(connection, "_accounts_fts_index"):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            connection._accounts_fts_index = cursor.fetchone() is not None
+    return connection._accounts_fts_index
+
+
+def search_accounts(queryset, query):
+    """Filter accounts queryset to the ones containing query in their name.
+
+    Queries shorter than trigram length can't use the trigram index, every name containing them
+    matches through a LIKE scan (keyset pages stop it once a page is filled when ordered by name),
+    longer ones use fts5 trigram index on SQLite or trigram gin index (LIKE) on PostgreSQL."""
+    query = normalize_name(query)
+    if not query:
+        return queryset
+    if len(query) < TRIGRAM_MIN_LENGTH:
+        return queryset.filter(name_normalized__contains=query)
+    if has_fts_index():
+        match = '"' + query.replace('"', '""') + '"'
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT account_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        )
+    return queryset.filter(name_normalized__contains=query)
+
+
+def search_rank(query):
+    """Rank expression of searched accounts for keyset_page, names starting with query first (0)"""
+    return Case(
+        When(name_normalized__startswith=normalize_name(query), then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
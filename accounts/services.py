@@ -0,0 +1,199 @@
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F, Value
+from decimal import Decimal, InvalidOperation
+from .cache import invalidate_accounts
+from .fields import CENTS, MAX_AMOUNT
+from .models import Account, Transfer
+import random
+import time
+import uuid
+
+DEFAULT_TRANSFER_RETRIES = 5
+RETRY_BACKOFF = 0.05  # seconds, doubled after every attempt
+RETRY_BACKOFF_MAX = 1.0
+
+
+class TransferError(Exception):
+    """Base class of transfer errors, message is safe to be returned to client"""
+
+    status = 400
+
+
+class InvalidTransferAmount(TransferError):
+    def __init__(self):
+        super().__init__("Invalid transfer balance")
+
+
+class SameAccountTransfer(TransferError):
+    def __init__(self):
+        super().__init__("Cannot transfer to himself")
+
+
+class InsufficientBalance(TransferError):
+    def __init__(self):
+        super().__init__("Insufficient balance")
+
+
+class AccountNotFound(TransferError):
+    status = 404
+
+    def __init__(self):
+        super().__init__("Account not found")
+
+
+class DatabaseBusy(TransferError):
+    """Lock contention outlasted every retry, nothing was applied and client may retry later"""
+
+    status = 503
+
+    def __init__(self):
+        super().__init__("Too many concurrent transfers, retry later")
+
+
+def parse_account_id(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise AccountNotFound()
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise InvalidTransferAmount()
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT:
+        raise InvalidTransferAmount()
+    if amount != amount.quantize(CENTS):
+        raise InvalidTransferAmount()  # balances are whole cents
+    return amount
+
+
+def apply_transfer(from_id, to_id, amount):
+    """Move amount between two accounts, must be called inside transaction.
+
+    Both rows are locked with select_for_update in pk order, so two opposite transfers
+    always lock in the same order and can not deadlock. Balances are changed with F() expressions
+    updating only balance column, debit is conditional so balance can never go below zero."""
+    locked = list(
+        Account.objects.select_for_update()
+        .filter(pk__in=[from_id, to_id])
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    if len(locked) != 2:
+        raise AccountNotFound()
+    # amount typed as balance field so it is sent to database in cents like the column
+    amount_value = Value(amount, output_field=Account._meta.get_field("balance"))
+    debited = Account.objects.filter(pk=from_id, balance__gte=amount).update(
+        balance=F("balance") - amount_value
+    )
+    if not debited:
+        raise InsufficientBalance()
+    Account.objects.filter(pk=to_id).update(balance=F("balance") + amount_value)
+    invalidate_accounts([from_id, to_id])
+    return Transfer.objects.create(from_account_id=from_id, to_account_id=to_id, amount=amount)
+
+
+def run_in_transaction(func, *args):
+    """Call func inside transaction.atomic() and return its result, retrying when database reports
+    lock contention (SQLite "database is locked", PostgreSQL serialization failure or deadlock).
+    Raise DatabaseBusy once ACCOUNTS_TRANSFER_RETRIES retries failed too."""
+    retries = getattr(settings, "ACCOUNTS_TRANSFER_RETRIES", DEFAULT_TRANSFER_RETRIES)
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return func(*args)
+        except OperationalError as e:
+            if transaction.get_connection().in_atomic_block:
+                raise  # can not retry inside outer transaction
+            if attempt == retries:
+                raise DatabaseBusy() from e
+            # jittered exponential backoff, 50ms, 100ms ... up to 1s
+            time.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2**attempt)))
+
+
+def transfer_funds(transfer_from, transfer_to, transfer_balance):
+    """Validate and apply transfer atomically, return its Transfer journal entry.
+    Raise TransferError subclass if transfer is not valid."""
+    from_id = parse_account_id(transfer_from)
+    to_id = parse_account_id(transfer_to)
+    amount = parse_amount(transfer_balance)
+    if from_id == to_id:
+        raise SameAccountTransfer()
+    return run_in_transaction(apply_transfer, from_id, to_id, amount)
+
+
+def apply_transfer_batch(transfers):
+    """Apply parsed transfers in order, must be called inside transaction.
+
+    All involved accounts are loaded and locked with one in_bulk query, balances are checked
+    and changed in memory in the given order, then written with a single bulk_update
+    and journaled with a single bulk_create.
+    Return list of errors (None for applied transfers)."""
+    ids = {account_id for transfer in transfers if transfer for account_id in transfer[:2]}
+    accounts = Account.objects.select_for_update().order_by("pk").in_bulk(ids)
+    changed = {}
+    journal = []
+    errors = []
+    for transfer in transfers:
+        if transfer is None:
+            errors.append(None)  # already rejected while parsing
+            continue
+        from_id, to_id, amount = transfer
+        if from_id not in accounts or to_id not in accounts:
+            errors.append(AccountNotFound())
+        elif accounts[from_id].balance < amount:
+            errors.append(InsufficientBalance())
+        else:
+            accounts[from_id].balance -= amount
+            accounts[to_id].balance += amount
+            changed[from_id] = accounts[from_id]
+            changed[to_id] = accounts[to_id]
+            journal.append(Transfer(from_account_id=from_id, to_account_id=to_id, amount=amount))
+            errors.append(None)
+    Account.objects.bulk_update(changed.values(), ["balance"], batch_size=1000)
+    Transfer.objects.bulk_create(journal, batch_size=1000)
+    if changed:
+        invalidate_accounts(changed)
+    return errors
+
+
+def parse_transfer(item):
+    """Validate one transfer of a batch, return (from_id, to_id, amount)"""
+    try:
+        transfer_from = item["transfer_from"]
+        transfer_to = item["transfer_to"]
+        transfer_balance = item["transfer_balance"]
+    except (KeyError, TypeError):
+        raise TransferError("Missing required parameters")
+    from_id = parse_account_id(transfer_from)
+    to_id = parse_account_id(transfer_to)
+    amount = parse_amount(transfer_balance)
+    if from_id == to_id:
+        raise SameAccountTransfer()
+    return from_id, to_id, amount
+
+
+def transfer_batch(items):
+    """Apply list of transfers (dicts with transfer_from, transfer_to & transfer_balance)
+    in one transaction, each transfer sees balances left by the previous ones.
+    Invalid transfers are skipped. Return per item results in the same order."""
+    parsed, errors = [], []
+    for item in items:
+        try:
+            parsed.append(parse_transfer(item))
+            errors.append(None)
+        except TransferError as e:
+            parsed.append(None)
+            errors.append(e)
+    apply_errors = run_in_transaction(apply_transfer_batch, parsed)
+    results = []
+    for index, error in enumerate(errors):
+        error = error or apply_errors[index]
+        if error:
+            results.append({"index": index, "status": "error", "error": str(error)})
+        else:
+            results.append({"index": index, "status": "ok"})
+    return results
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_accounts
+from .models import Account
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_account_cache(sender, instance, **kwargs):
+    """Account changed using the ORM (admin, shell...), drop its cached copies"""
+    invalidate_accounts([instance.pk])
@@ -0,0 +1,243 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from .compression import guess_content_type
+from .models import ImportJob, ImportMode, UploadChunk, UploadSession
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+
+DEFAULT_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_UPLOAD_SIZE = 50 * 1024**3
+DEFAULT_SESSION_TTL = 24 * 3600
+DEFAULT_MAX_OPEN_SESSIONS = 5
+DEFAULT_MAX_RESERVED_SIZE = 50 * 1024**3
+# a chunk claimed longer ago than this by a put which never recorded it (crashed worker) can be sent again
+CHUNK_CLAIM_TIMEOUT = 300
+SPOOL_DIR = "uploads/"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Base class of chunked upload errors, message is safe to be returned to client"""
+
+    status = 400
+
+
+class UploadSessionNotFound(UploadError):
+    status = 404
+
+    def __init__(self):
+        super().__init__("Upload session not found")
+
+
+class UploadConflict(UploadError):
+    """Request does not match the state of the session (finalized, missing chunks)"""
+
+    status = 409
+
+
+class UploadLimitExceeded(UploadError):
+    """Client has too many open sessions or reserved too many bytes"""
+
+    status = 429
+
+
+def get_session(pk):
+    try:
+        return UploadSession.objects.get(pk=pk)
+    except UploadSession.DoesNotExist:
+        raise UploadSessionNotFound()
+
+
+def spool_path(session):
+    """Local file chunks of session are written to, kept in media storage so finalize only renames it"""
+    return default_storage.path(f"{SPOOL_DIR}{session.pk}.part")
+
+
+def parse_size(value, name, maximum):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise UploadError(f"Invalid {name}")
+    if not 0 <= size <= maximum:
+        raise UploadError(f"{name} must be between 0 and {maximum}")
+    return size
+
+
+def check_client_limits(client, total_size):
+    """Open sessions of client are capped in number (ACCOUNTS_UPLOAD_MAX_OPEN_SESSIONS) and in bytes reserved by
+    their spool files (ACCOUNTS_UPLOAD_MAX_RESERVED_SIZE). Concurrent creates of a client may pass them by a few"""
+    max_sessions = getattr(settings, "ACCOUNTS_UPLOAD_MAX_OPEN_SESSIONS", DEFAULT_MAX_OPEN_SESSIONS)
+    max_reserved = getattr(settings, "ACCOUNTS_UPLOAD_MAX_RESERVED_SIZE", DEFAULT_MAX_RESERVED_SIZE)
+    open_sessions = UploadSession.objects.filter(client=client, status=UploadSession.Status.OPEN).aggregate(
+        count=Count("pk"), reserved=Sum("total_size")
+    )
+    if open_sessions["count"] >= max_sessions:
+        raise UploadLimitExceeded("Too many open upload sessions, finalize them or wait for them to expire")
+    if (open_sessions["reserved"] or 0) + total_size > max_reserved:
+        raise UploadLimitExceeded(f"Open upload sessions may reserve at most {max_reserved} bytes")
+
+
+def create_session(file_name, total_size, chunk_size=None, content_type=None, mode=ImportMode.INSERT, client=""):
+    """Create upload session of client (address, see docspert.admission.client_id) and its spool file,
+    a sparse file of total_size bytes so chunks can be written at their offset in any order"""
+    max_chunk_size = getattr(settings, "ACCOUNTS_UPLOAD_MAX_CHUNK_SIZE", DEFAULT_MAX_CHUNK_SIZE)
+    max_size = getattr(settings, "ACCOUNTS_UPLOAD_MAX_SIZE", DEFAULT_MAX_UPLOAD_SIZE)
+    total_size = parse_size(total_size, "total_size", max_size)
+    chunk_size = parse_size(chunk_size or max_chunk_size, "chunk_size", max_chunk_size)
+    if not chunk_size:
+        raise UploadError("chunk_size must be positive")
+    if mode not in ImportMode.values:
+        raise UploadError(f"mode must be one of {', '.join(ImportMode.values)}")
+    file_name = get_valid_filename(os.path.basename(str(file_name or "accounts")))[:100]
+    check_client_limits(client, total_size)
+    session = UploadSession.objects.create(
+        client=client,
+        file_name=file_name,
+        # compressed files are recognized by content when imported
+        content_type=content_type or guess_content_type(file_name) or "text/csv",
+        mode=mode,
+        total_size=total_size,
+        chunk_size=chunk_size,
+    )
+    path = spool_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as spool:
+        spool.truncate(total_size)
+    return session
+
+
+def write_chunk(session, index, stream, sha256):
+    """Copy chunk from stream (request body) to a temporary file next to the spool file, without
+    holding it in memory. Only when its size & sha256 checksum match it is copied to its offset in
+    the spool file and recorded as received, so a failed re-send never damages a received chunk.
+    Sending the same chunk again overwrites it.
+
+    No transaction is open while the chunk is copied & synced: a short one claims the chunk
+    (it counts as missing, other puts of it answer 409) and another one records it as received."""
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadConflict("Upload session is already finalized")
+    if not 0 <= index < session.chunk_count:
+        raise UploadError(f"Chunk index must be between 0 and {session.chunk_count - 1}")
+    if not sha256:
+        raise UploadError("Missing chunk sha256 checksum")
+    expected = session.expected_chunk_size(index)
+    digest = hashlib.sha256()
+    size = 0
+    path = spool_path(session)
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as part:
+        while data := stream.read(COPY_BUFFER_SIZE):
+            size += len(data)
+            if size > expected:
+                break
+            digest.update(data)
+            part.write(data)
+        if size != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes")
+        if digest.hexdigest() != sha256.lower():
+            raise UploadError(f"Checksum mismatch of chunk {index}")
+        part.seek(0)
+        chunk = claim_chunk(session, index, size, digest.hexdigest())
+        try:
+            with open(path, "r+b") as spool:
+                spool.seek(index * session.chunk_size)
+                shutil.copyfileobj(part, spool, COPY_BUFFER_SIZE)
+                spool.flush()
+                os.fsync(spool.fileno())  # chunk reported as received must survive a crash
+        except BaseException:
+            UploadChunk.objects.filter(pk=chunk.pk, claimed_at=chunk.claimed_at).delete()
+            raise
+    # only when claim is still ours, not taken over by another put after CHUNK_CLAIM_TIMEOUT
+    if not UploadChunk.objects.filter(pk=chunk.pk, claimed_at=chunk.claimed_at).update(received=True):
+        raise UploadConflict(f"Chunk {index} was sent again while it was written, check the session status")
+
+
+def claim_chunk(session, index, size, sha256):
+    """Mark chunk as being written (not received) so it can't be written twice at once and finalize
+    waits for it. Session row lock (write lock on SQLite) is held only for this update"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != UploadSession.Status.OPEN:
+            raise UploadConflict("Upload session is already finalized")
+        now = timezone.now()
+        if UploadChunk.objects.filter(
+            session=session,
+            index=index,
+            received=False,
+            claimed_at__gt=now - datetime.timedelta(seconds=CHUNK_CLAIM_TIMEOUT),
+        ).exists():
+            raise UploadConflict(f"Chunk {index} is being written, retry later")
+        chunk, _ = UploadChunk.objects.update_or_create(
+            session=session,
+            index=index,
+            defaults={"size": size, "sha256": sha256, "received": False, "claimed_at": now},
+        )
+    return chunk
+
+
+def session_status(session):
+    """Session state as json ready dict, `missing` are the chunks still to be sent"""
+    received = list(session.chunks.filter(received=True).order_by("index").values_list("index", flat=True))
+    received_set = set(received)
+    return {
+        "id": session.pk,
+        "file_name": session.file_name,
+        "status": session.status,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "chunk_count": session.chunk_count,
+        "received": received,
+        "missing": [index for index in range(session.chunk_count) if index not in received_set],
+        "import_job_url": (
+            reverse("import_job_status", args=[session.import_job_id]) if session.import_job_id else None
+        ),
+    }
+
+
+def finalize_session(session):
+    """Hand the complete spool file to a background ImportJob by path: it is renamed into imports
+    storage, never copied. Return the job"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != UploadSession.Status.OPEN:
+            raise UploadConflict("Upload session is already finalized")
+        missing = session.chunk_count - session.chunks.filter(received=True).count()
+        if missing:
+            raise UploadConflict(f"{missing} chunks are missing")
+        name = default_storage.get_available_name(
+            f"imports/{session.file_name}", max_length=ImportJob._meta.get_field("file").max_length
+        )
+        job = ImportJob.objects.create(file=name, content_type=session.content_type, mode=session.mode)
+        session.status = UploadSession.Status.FINALIZED
+        session.import_job = job
+        session.save(update_fields=["status", "import_job"])
+        os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+        os.replace(spool_path(session), default_storage.path(name))  # last, failure rolls back the job
+    return job
+
+
+def delete_expired_sessions(max_age=None):
+    """Delete open sessions older than max_age seconds (ACCOUNTS_UPLOAD_SESSION_TTL) with their spool files.
+    Return number of deleted sessions"""
+    if max_age is None:
+        max_age = getattr(settings, "ACCOUNTS_UPLOAD_SESSION_TTL", DEFAULT_SESSION_TTL)
+    expired = UploadSession.objects.filter(
+        status=UploadSession.Status.OPEN,
+        created_at__lt=timezone.now() - datetime.timedelta(seconds=max_age),
+    )
+    count = 0
+    for session in expired:
+        try:
+            os.remove(spool_path(session))
+        except FileNotFoundError:
+            pass
+        session.delete()
+        count += 1
+    return count
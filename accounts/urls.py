@@ -4,9 +4,20 @@ from .views import *
 
 urlpatterns = [
     path("upload", AccountsUploadView.as_view(), name="accounts_upload"),
+    path("imports/<uuid:pk>", ImportJobStatusView.as_view(), name="import_job_status"),
+    path("imports/rejected/<uuid:pk>", RejectedRowsReportView.as_view(), name="rejected_rows_report"),
+    path("uploads", UploadSessionCreateView.as_view(), name="upload_session_create"),
+    path("uploads/<uuid:pk>", UploadSessionView.as_view(), name="upload_session"),
+    path("uploads/<uuid:pk>/chunks/<int:index>", UploadChunkView.as_view(), name="upload_chunk"),
+    path("uploads/<uuid:pk>/finalize", UploadSessionFinalizeView.as_view(), name="upload_session_finalize"),
     path("list", AccountsListView.as_view(), name="accounts_list"),
     path("search", AccountSearchView.as_view(), name="account_search"),
+    path("export", AccountsExportView.as_view(), name="accounts_export"),
+    path("reports/summary", BalanceSummaryView.as_view(), name="balance_summary"),
+    path("reports/histogram", BalanceHistogramView.as_view(), name="balance_histogram"),
+    path("reports/top", TopAccountsView.as_view(), name="top_accounts"),
     path("details/<uuid:pk>", AccountDetailsView.as_view(), name="account_details"),
     path("transfer/<uuid:pk>", AccountTransferFundsView.as_view(), name="account_transfer_fund"),
-    path("tranfer-balance", TransferFundsView.as_view(), name="transfer_balance")
+    path("tranfer-balance", TransferFundsView.as_view(), name="transfer_balance"),
+    path("transfers/batch", BatchTransferFundsView.as_view(), name="transfer_batch"),
 ]
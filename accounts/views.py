@@ -1,14 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.generic import View, ListView, DetailView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.safestring import mark_safe
+from docspert.admission import client_id
+from docspert.metrics import record_rows, span
+from docspert.responses import ThreadedFileResponse, ThreadedStreamingHttpResponse
+from .cache import aget_or_set_search, get_account
+from .cards import iter_cards, render_cards
+from .columnar import ColumnarSource, save_columnar
+from .exporters import EXPORT_FORMATS, iter_export
 from .forms import AccountsUploadForm
-from .models import Account
-from decimal import Decimal
+from .importers import ImportMode, RejectedRows, rejected_report_name, save_accounts
+from .jobs import enqueue_import
+from .ledger import account_history
+from .pagination import akeyset_page, get_page_size, keyset_page
+from .reports import (
+    DEFAULT_BUCKETS,
+    DEFAULT_TOP,
+    MAX_BUCKETS,
+    MAX_TOP,
+    balance_histogram,
+    balance_summary,
+    top_accounts,
+)
+from .search import normalize_name, search_accounts, search_rank
+from .models import Account, ImportJob
+from .services import DatabaseBusy, TransferError, transfer_batch, transfer_funds
+from .uploads import UploadError, create_session, finalize_session, get_session, session_status, write_chunk
+import json
 
 
 # Create your views here.
 
+CARDS_PLACEHOLDER = mark_safe("<!-- account cards -->")
+
 
 class AccountsHomeView(View):
     """Responsible of returning home page of accounts"""
@@ -35,13 +68,39 @@ class AccountsUploadView(View):
 
     def post(self, request):
         """Receive uploaded file then validate the file according to result of validation, page will be rendered"""
-        upload_form = AccountsUploadForm(request.POST, request.FILES)
+        upload_form = AccountsUploadForm(request.POST, request.FILES, streaming=True)
         if upload_form.is_valid():
+            import_mode = upload_form.cleaned_data["import_mode"] or ImportMode.INSERT
+            if upload_form.cleaned_data["background"]:
+                # Only store the file, `manage.py process_imports` worker will import it
+                job = enqueue_import(upload_form.files["file"], mode=import_mode)
+                return JsonResponse(
+                    {
+                        "job_id": job.id,
+                        "status_url": reverse("import_job_status", args=[job.id]),
+                    },
+                    status=202,
+                )
             data = upload_form.cleaned_data["file"]
+            rejected = RejectedRows()
             try:
-                self.save_accounts(data)
+                stats = self.save_accounts(data, import_mode, rejected)
+                report_id = rejected.save()
             except Exception as e:
                 return render(request, "500.html", {"error_message": e})
+            finally:
+                rejected.close()
+            if report_id:
+                # valid rows are saved, show what was rejected instead of redirecting
+                return render(
+                    request,
+                    self.template_name,
+                    {
+                        "form": AccountsUploadForm(),
+                        "stats": stats,
+                        "rejected_report_url": reverse("rejected_rows_report", args=[report_id]),
+                    },
+                )
         else:
             return render(
                 request,
@@ -53,15 +112,97 @@ class AccountsUploadView(View):
         success_url = reverse_lazy("accounts_list")
         return redirect(success_url)
 
-    def save_accounts(self, data):
-        """Save accounts into database"""
+    def save_accounts(self, data, mode=ImportMode.INSERT, rejected=None):
+        """Save accounts into database, data is consumed lazily and written in bounded batches.
+        Invalid & duplicate rows are skipped and written to rejected report, valid rows are committed together"""
+        save = save_columnar if isinstance(data, ColumnarSource) else save_accounts
+        stats = save(data, mode=mode, skip_invalid=True, rejected=rejected, atomic=True)
+        record_rows(stats.parsed)
+        return stats
+
+
+class ImportJobStatusView(View):
+    """Return progress of background import job as json"""
+
+    def get(self, request, pk):
+        try:
+            job = ImportJob.objects.get(pk=pk)
+        except ImportJob.DoesNotExist:
+            return JsonResponse({"error": "Import job not found"}, status=404)
+        return JsonResponse(job.to_dict(), status=200)
+
+
+class RejectedRowsReportView(View):
+    """Download csv report of rows rejected by an import"""
+
+    def get(self, request, pk):
+        try:
+            report = default_storage.open(rejected_report_name(pk), "rb")
+        except FileNotFoundError:
+            raise Http404("No rejected rows report found")
+        return ThreadedFileResponse(report, as_attachment=True, filename=f"rejected-rows-{pk}.csv")
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadSessionCreateView(View):
+    """Start chunked upload of a big accounts file, return session with its chunk size & count"""
+
+    def post(self, request):
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            return JsonResponse({"error": "Invalid json"}, status=400)
+        try:
+            session = create_session(
+                payload.get("file_name"),
+                payload.get("total_size"),
+                chunk_size=payload.get("chunk_size"),
+                content_type=payload.get("content_type"),
+                mode=payload.get("mode") or ImportMode.INSERT,
+                client=client_id(request),
+            )
+        except UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+        return JsonResponse(session_status(session), status=201)
+
+
+class UploadSessionView(View):
+    """Return state of chunked upload, `missing` lists chunks to send when resuming it"""
+
+    def get(self, request, pk):
         try:
-            accounts = [Account(**record) for record in data]
-            Account.objects.bulk_create(
-                accounts, ignore_conflicts=True
-            )  # ignore confict to not raise error if user upload the file more than one time only will insert the new records each time.
-        except Exception as e:
-            raise
+            return JsonResponse(session_status(get_session(pk)))
+        except UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadChunkView(View):
+    """Receive one chunk as raw request body, X-Chunk-SHA256 header carries its sha256 checksum.
+    Body is streamed to disk so chunks may exceed DATA_UPLOAD_MAX_MEMORY_SIZE"""
+
+    def put(self, request, pk, index):
+        try:
+            write_chunk(get_session(pk), index, request, request.headers.get("X-Chunk-SHA256"))
+        except UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+        return JsonResponse({"index": index, "received": True})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadSessionFinalizeView(View):
+    """Hand complete upload to a background import job, same response as background upload"""
+
+    def post(self, request, pk):
+        try:
+            job = finalize_session(get_session(pk))
+        except UploadError as e:
+            return JsonResponse({"error": str(e)}, status=e.status)
+        return JsonResponse(
+            {"job_id": job.id, "status_url": reverse("import_job_status", args=[job.id])}, status=202
+        )
 
 
 class AccountsListView(ListView):
@@ -77,40 +218,177 @@ class AccountsListView(ListView):
         query_set = super().get_queryset()
         search_value = self.request.GET.get("search_query", "")
         if search_value:
-            query_set = query_set.filter(
-                name__icontains=search_value
-            )  # Filter and return only all records that contain search_value as part of account name
+            query_set = search_accounts(
+                query_set, search_value
+            )  # Filter using name search index and return only records that contain search_value as part of account name
         return query_set
 
-
-class AccountSearchView(ListView):
-    """Handle Listing of accounts & search for specific account using name, return json obj"""
+    def get_context_data(self, **kwargs):
+        """Render only one page of accounts, next page starts after the cursor of the last rendered account"""
+        try:
+            accounts, next_cursor = keyset_page(
+                self.object_list, self.request.GET.get("cursor"), get_page_size(self.request)
+            )
+        except ValueError:  # invalid cursor, start from first page
+            accounts, next_cursor = keyset_page(self.object_list, None, get_page_size(self.request))
+        record_rows(len(accounts))
+        context = super().get_context_data(object_list=accounts, **kwargs)
+        context["next_cursor"] = next_cursor
+        context["search_value"] = self.request.GET.get("search_query", "")
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        """Render right away so the time spent in template (the cards loop) is measured on its own.
+        With ACCOUNTS_LIST_STREAM the page is streamed instead, see stream_page"""
+        if settings.ACCOUNTS_LIST_STREAM:
+            return ThreadedStreamingHttpResponse(self.stream_page(context), content_type="text/html; charset=utf-8")
+        with span("render"):
+            context["cards"] = render_cards(context["accounts"])
+            return super().render_to_response(context, **response_kwargs).render()
+
+    def stream_page(self, context):
+        """Page is rendered once around a placeholder, the part before it is sent
+        before any card is rendered then cards follow chunk by chunk. Rendering of each part is timed
+        in the render span, not the time spent waiting for the client to read it.
+        Under ASGI chunks are rendered in the sync thread one at a time (ThreadedStreamingHttpResponse)"""
+        with span("render"):
+            page = render_to_string(
+                self.template_name, {**context, "cards_placeholder": CARDS_PLACEHOLDER}, self.request
+            )
+            head, tail = page.split(CARDS_PLACEHOLDER, 1)
+        yield head
+        cards = iter_cards(context["accounts"])
+        while True:
+            with span("render"):
+                chunk = next(cards, None)
+            if chunk is None:
+                break
+            yield chunk
+        yield tail
+
+
+class AccountSearchView(View):
+    """Handle search for specific account using name, return json obj.
+    Async view, served natively under ASGI using async cache & ORM iteration"""
 
     model = Account
 
     def get_queryset(self):
-        query_set = super().get_queryset()
+        query_set = Account.objects.all()
         search_value = self.request.GET.get("search_query", "")
         if search_value:
-            query_set = query_set.filter(
-                name__icontains=search_value
-            )  # Filter and return only all records that contain search_value as part of account name
+            query_set = search_accounts(
+                query_set, search_value
+            )  # Filter using name search index and return only records that contain search_value as part of account name
         return query_set
 
-    def render_to_response(self, context):
-        data = list(self.get_queryset().values())
-        return JsonResponse(data, safe=False)
+    async def get(self, request):
+        """Return one page of accounts ordered by (name, id) and cursor of the next page,
+        searches list names starting with the query first. Pages are cached until any account changes"""
+        cursor = request.GET.get("cursor")
+        page_size = get_page_size(request)
+
+        async def get_page():
+            # building queryset may check search index existence using sync connection
+            query_set = await sync_to_async(self.get_queryset)()
+            data, next_cursor = await akeyset_page(
+                query_set.values("id", "name", "balance"),
+                cursor,
+                page_size,
+                rank=search_rank(search_value) if search_value else None,  # best matches first
+            )
+            return {"results": data, "next": next_cursor}
+
+        search_value = normalize_name(request.GET.get("search_query", ""))
+        try:
+            page = await aget_or_set_search(("search", search_value, cursor, page_size), get_page)
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+        record_rows(len(page["results"]))
+        return JsonResponse(page)
 
 
-class AccountDetailsView(DetailView):
-    """Handle account details"""
+class AccountsExportView(View):
+    """Stream all accounts (or the ones matching search_query) as csv, ndjson, parquet or arrow file"""
+
+    def get(self, request):
+        file_format = request.GET.get("format", "csv")
+        if file_format not in EXPORT_FORMATS:
+            return JsonResponse(
+                {"error": f"Unsupported format, allowed formats {', '.join(EXPORT_FORMATS)}"}, status=400
+            )
+        query_set = Account.objects.all()
+        search_value = request.GET.get("search_query", "")
+        if search_value:
+            query_set = search_accounts(query_set, search_value)
+        response = ThreadedStreamingHttpResponse(
+            iter_export(file_format, query_set), content_type=EXPORT_FORMATS[file_format]
+        )
+        response["Content-Disposition"] = f'attachment; filename="accounts.{file_format}"'
+        return response
+
+
+def get_int_param(request, name, default, maximum):
+    """Positive integer query parameter capped to maximum, default if missing or not valid"""
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        value = default
+    return min(max(value, 1), maximum)
+
+
+class BalanceSummaryView(View):
+    """Return number of accounts and total, average, min & max balance as json"""
+
+    def get(self, request):
+        return JsonResponse(balance_summary())
+
+
+class BalanceHistogramView(View):
+    """Return number of accounts per balance range as json, `buckets` query parameter sets ranges count"""
+
+    def get(self, request):
+        buckets = get_int_param(request, "buckets", DEFAULT_BUCKETS, MAX_BUCKETS)
+        return JsonResponse({"buckets": balance_histogram(buckets)})
+
+
+class TopAccountsView(View):
+    """Return accounts with highest balances (lowest with order=asc) as json"""
+
+    def get(self, request):
+        limit = get_int_param(request, "limit", DEFAULT_TOP, MAX_TOP)
+        lowest = request.GET.get("order") == "asc"
+        accounts = top_accounts(limit, lowest=lowest)
+        record_rows(len(accounts))
+        return JsonResponse({"results": accounts})
+
+
+class CachedAccountMixin:
+    """Load account of detail views using read through cache"""
+
+    def get_object(self, queryset=None):
+        try:
+            return get_account(self.kwargs["pk"])
+        except Account.DoesNotExist:
+            raise Http404("No account found matching the query")
+
+
+class AccountDetailsView(CachedAccountMixin, DetailView):
+    """Handle account details with paginated transfers history"""
 
     model = Account
     template_name = "account-details.html"
     context_object_name = "account"
+    history_paginate_by = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        paginator = Paginator(account_history(self.object.pk), self.history_paginate_by)
+        context["history_page"] = paginator.get_page(self.request.GET.get("page"))
+        return context
 
 
-class AccountTransferFundsView(DetailView):
+class AccountTransferFundsView(CachedAccountMixin, DetailView):
     """Display transfer account page"""
 
     model = Account
@@ -119,11 +397,12 @@ class AccountTransferFundsView(DetailView):
 
 
 class TransferFundsView(View):
-    """Handle and validate transferring balance between two accounts"""
+    """Handle and validate transferring balance between two accounts.
+    Async view, transfer transaction itself runs in sync thread as transaction.atomic is sync only"""
 
     model = Account
 
-    def get(self, request):
+    async def get(self, request):
         transfer_from = request.GET.get("transfer_from")
         transfer_to = request.GET.get("transfer_to")
         transfer_balance = request.GET.get("transfer_balance")
@@ -132,25 +411,62 @@ class TransferFundsView(View):
             return JsonResponse({"error": "Missing required parameters"}, status=400)
 
         try:
-            transfer_from_account = Account.objects.get(id=transfer_from)
-            transfer_to_account = Account.objects.get(id=transfer_to)
-            transfer_balance = Decimal(transfer_balance)
+            await sync_to_async(transfer_funds)(transfer_from, transfer_to, transfer_balance)
+        except TransferError as e:
+            return transfer_error_response(e)
+        return JsonResponse({"message": "Transfer successful"}, status=200)
 
-            # Check if user try to tranfer to himself
-            if transfer_from_account == transfer_to_account:
-                return JsonResponse({"error": "Cannot transfer to himself"}, status=400)
-            # Check if transfer_from account has enough balance
-            if transfer_from_account.balance < transfer_balance:
-                return JsonResponse({"error": "Insufficient balance"}, status=400)
 
-            transfer_from_account.balance -= transfer_balance
-            transfer_to_account.balance += transfer_balance
-            transfer_from_account.save()
-            transfer_to_account.save()
+def transfer_error_response(error):
+    """Json response of a TransferError, busy database answers 503 with Retry-After"""
+    response = JsonResponse({"error": str(error)}, status=error.status)
+    if isinstance(error, DatabaseBusy):
+        response["Retry-After"] = str(settings.ADMISSION_RETRY_AFTER)
+    return response
 
-            return JsonResponse({"message": "Transfer successful"}, status=200)
 
-        except Account.DoesNotExist:
-            return JsonResponse({"error": "Account not found"}, status=404)
+class BatchTransferFundsView(View):
+    """Apply list of transfers posted as json in one transaction, return result of each transfer.
+    CSRF protected like the transfer form, GET sets the csrftoken cookie to send back in X-CSRFToken"""
+
+    @method_decorator(ensure_csrf_cookie)
+    def get(self, request):
+        return JsonResponse(
+            {
+                "max_transfers": settings.ACCOUNTS_TRANSFER_BATCH_MAX_SIZE,
+                "max_bytes": settings.ACCOUNTS_TRANSFER_BATCH_MAX_BYTES,
+            }
+        )
+
+    def post(self, request):
+        # batches may exceed DATA_UPLOAD_MAX_MEMORY_SIZE, body is read from the stream up to its own cap
+        max_bytes = settings.ACCOUNTS_TRANSFER_BATCH_MAX_BYTES
+        too_large = JsonResponse({"error": f"Batch body is limited to {max_bytes} bytes"}, status=413)
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
         except ValueError:
-            return JsonResponse({"error": "Invalid transfer balance"}, status=400)
+            content_length = 0
+        if content_length > max_bytes:
+            return too_large
+        body = request.read(max_bytes + 1)
+        if len(body) > max_bytes:
+            return too_large
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid json"}, status=400)
+        transfers = payload.get("transfers") if isinstance(payload, dict) else payload
+        if not isinstance(transfers, list) or not transfers:
+            return JsonResponse({"error": "Missing required parameters"}, status=400)
+        max_size = settings.ACCOUNTS_TRANSFER_BATCH_MAX_SIZE
+        if len(transfers) > max_size:
+            return JsonResponse({"error": f"Batch is limited to {max_size} transfers"}, status=400)
+        try:
+            results = transfer_batch(transfers)
+        except DatabaseBusy as e:
+            return transfer_error_response(e)
+        succeeded = sum(result["status"] == "ok" for result in results)
+        return JsonResponse(
+            {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results},
+            status=200,
+        )
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.cache import caches
+from .metrics import registry
+import math
+import threading
+import time
+
+DEFAULT_CACHE_ALIAS = "ratelimit"
+DEFAULT_MAX_WRITES_IN_FLIGHT = 16
+DEFAULT_RETRY_AFTER = 1
+
+
+def get_cache():
+    """Cache holding token buckets, configured by CACHES[RATE_LIMIT_CACHE_ALIAS] (local memory by default,
+    use a shared cache so all processes count requests of a client together)"""
+    return caches[getattr(settings, "RATE_LIMIT_CACHE_ALIAS", DEFAULT_CACHE_ALIAS)]
+
+
+def client_id(request):
+    """Address of client, first address of RATE_LIMIT_CLIENT_HEADER (e.g. HTTP_X_FORWARDED_FOR)
+    when set, only trust it behind a proxy that overwrites it"""
+    header = getattr(settings, "RATE_LIMIT_CLIENT_HEADER", None)
+    if header and request.META.get(header):
+        return request.META[header].split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def bucket_key(view, client):
+    return f"ratelimit:{view}:{client}"
+
+
+def bucket_timeout(rate, burst):
+    # bucket refilled to burst is the same as no bucket, let it expire
+    return math.ceil(burst / rate) + 1
+
+
+def refill(state, now, rate, burst):
+    """One step of token bucket holding up to burst tokens refilled at rate tokens per second.
+    state is (tokens, time of last update) or None for a full bucket.
+    Return (state to store, 0 if a token was taken else seconds until the next token)"""
+    tokens, updated = state or (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+def take_token(view, client, rate, burst):
+    """Take a token from bucket of client for view, return seconds to wait (0 when admitted).
+    Read & write are not atomic, concurrent requests of the same client may let a few more through"""
+    cache = get_cache()
+    key = bucket_key(view, client)
+    state, wait = refill(cache.get(key), time.time(), rate, burst)
+    cache.set(key, state, bucket_timeout(rate, burst))
+    return wait
+
+
+async def atake_token(view, client, rate, burst):
+    cache = get_cache()
+    key = bucket_key(view, client)
+    state, wait = refill(await cache.aget(key), time.time(), rate, burst)
+    await cache.aset(key, state, bucket_timeout(rate, burst))
+    return wait
+
+
+class InFlightLimiter:
+    """Number of write requests in flight in this process. They queue on the database write lock,
+    once `limit` of them are queued new ones are shed instead of waiting too"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def acquire(self, limit):
+        with self.lock:
+            if self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.count -= 1
+
+
+writes = InFlightLimiter()
+
+
+def view_limits(view):
+    """(rate, burst) of view or None, and in flight limit of view or None if it is not a write view"""
+    rate_limit = getattr(settings, "RATE_LIMITS", {}).get(view)
+    if view not in getattr(settings, "ADMISSION_WRITE_VIEWS", ()):
+        return rate_limit, None
+    return rate_limit, getattr(settings, "ADMISSION_MAX_WRITES_IN_FLIGHT", DEFAULT_MAX_WRITES_IN_FLIGHT)
+
+
+def count(view, outcome):
+    registry.inc(
+        "docspert_admission_requests",
+        help_text="Requests admitted or rejected (rate_limited, shed) by admission control.",
+        view=view,
+        outcome=outcome,
+    )
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'docspert.settings')
+os.environ.setdefault('DOCSPERT_SERVER', 'asgi')  # settings turn off persistent connections under ASGI
 
 application = get_asgi_application()
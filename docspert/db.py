@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created, dispatch_uid="docspert.db.apply_sqlite_pragmas")
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Run PRAGMAs of SQLITE_PRAGMAS setting on every new SQLite connection
+    (journal mode, synchronous, mmap & cache size, busy timeout...)"""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if not name.isidentifier():
+                raise ValueError(f"Invalid SQLite pragma name: {name!r}")
+            cursor.execute(f"PRAGMA {name} = {value}")
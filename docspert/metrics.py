@@ -0,0 +1,181 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+
+DEFAULT_WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+_current_request = ContextVar("current_request_metrics", default=None)
+
+
+class RollingHistogram:
+    """Keep last `window` observations for quantiles, count & sum are kept since startup"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        values = sorted(self.values)
+        if not values:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: values[min(int(q * len(values)), len(values) - 1)] for q in QUANTILES}
+
+
+class MetricsRegistry:
+    """In memory metrics of this process, rendered in Prometheus text format"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.help = {}
+
+    def observe(self, name, value, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help.setdefault(name, help_text)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = RollingHistogram(self.window)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.help.setdefault(name, help_text)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Histograms are exposed as summaries (window quantiles + total sum & count)"""
+        lines = []
+        with self.lock:
+            families = {}
+            for (name, labels), histogram in self.histograms.items():
+                families.setdefault(("summary", name), []).append((labels, histogram))
+            for (name, labels), value in self.counters.items():
+                families.setdefault(("counter", name), []).append((labels, value))
+            for (kind, name), samples in sorted(families.items(), key=lambda item: item[0][1]):
+                if self.help.get(name):
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, sample in sorted(samples, key=lambda s: s[0]):
+                    if kind == "counter":
+                        lines.append(f"{name}{format_labels(labels)} {sample}")
+                        continue
+                    for q, value in sample.quantiles().items():
+                        lines.append(f"{name}{format_labels(labels + (('quantile', q),))} {value}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {sample.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {sample.count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{escape_label(value)}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry(getattr(settings, "METRICS_WINDOW", DEFAULT_WINDOW))
+
+
+class RequestMetrics:
+    """Timings of one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.spans = {}
+
+    def server_timing(self, total):
+        parts = [
+            f"total;dur={total * 1000:.1f}",
+            f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        parts.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items())
+        return ", ".join(parts)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries & their time in metrics of current request"""
+    metrics = _current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(connection, **kwargs):
+    """Keep record_query in execute wrappers of connection for its whole life.
+    Connections are per thread, an async view runs its queries in a sync_to_async thread, so the
+    wrapper can't be added for the request only. Current request is found using a context var,
+    which sync_to_async copies to that thread."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder, dispatch_uid="docspert.metrics.install_query_recorder")
+
+
+@contextmanager
+def request_metrics():
+    """Make a new RequestMetrics the current one while the request is handled"""
+    metrics = RequestMetrics()
+    token = _current_request.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_request.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Time a block of code, added to Server-Timing of current request & docspert_span_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        registry.observe("docspert_span_seconds", seconds, "Time spent in instrumented code blocks.", span=name)
+        metrics = _current_request.get()
+        if metrics is not None:
+            metrics.spans[name] = metrics.spans.get(name, 0.0) + seconds
+
+
+def is_metrics_client(request):
+    """Whether request comes from an address of METRICS_ALLOWED_IPS, allowed to read metrics & timings"""
+    return request.META.get("REMOTE_ADDR") in getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+
+
+def record_rows(count):
+    """Add number of rows returned by current view"""
+    metrics = _current_request.get()
+    if metrics is not None:
+        metrics.rows += count
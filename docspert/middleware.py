@@ -0,0 +1,156 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .admission import DEFAULT_RETRY_AFTER, atake_token, client_id, count, take_token, view_limits, writes
+from .metrics import install_query_recorder, is_metrics_client, registry, request_metrics
+import math
+import time
+
+
+class PerformanceMiddleware:
+    """Record wall time, db queries & their time, rows and response size of each view.
+    Metrics are kept per view in docspert.metrics.registry and the timings of the request
+    are sent back in Server-Timing header, only with DEBUG on or to METRICS_ALLOWED_IPS
+    (timings & query counts tell outsiders how the app works)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # connections opened later get the query recorder through connection_created signal
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_metrics() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        with request_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.start
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match and match.view_name else "unmatched"
+        labels = {"view": view, "method": request.method}
+        registry.observe("docspert_request_seconds", total, "Wall time of requests.", **labels)
+        registry.observe("docspert_db_queries", metrics.queries, "Database queries per request.", **labels)
+        registry.observe("docspert_db_seconds", metrics.query_seconds, "Database time per request.", **labels)
+        registry.observe("docspert_rows", metrics.rows, "Rows returned per request.", **labels)
+        if not response.streaming:  # streamed size is unknown until the client consumed it
+            registry.observe(
+                "docspert_response_bytes", len(response.content), "Response body size.", **labels
+            )
+        if settings.DEBUG or is_metrics_client(request):
+            response["Server-Timing"] = metrics.server_timing(total)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise static files middleware usable in an async middleware chain.
+    WhiteNoiseMiddleware is sync only, under ASGI it would make django run the whole chain,
+    async views included, in a thread per request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # opens the file and stats it, keep it off the event loop
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class AdmissionControlMiddleware:
+    """Reject requests over per client token bucket rate limits (RATE_LIMITS) and requests of write views
+    (ADMISSION_WRITE_VIEWS) over ADMISSION_MAX_WRITES_IN_FLIGHT of this process, with 429 & Retry-After,
+    before they reach sessions or the view. Outcomes are counted in docspert.metrics.registry."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view, rate_limit, max_in_flight = self.limits(request)
+        if rate_limit:
+            wait = take_token(view, client_id(request), *rate_limit)
+            if wait:
+                return self.reject(view, "rate_limited", wait)
+        if max_in_flight is None:
+            if rate_limit:
+                count(view, "admitted")
+            return self.get_response(request)
+        if not writes.acquire(max_in_flight):
+            return self.reject(view, "shed")
+        count(view, "admitted")
+        try:
+            return self.get_response(request)
+        finally:
+            writes.release()
+
+    async def __acall__(self, request):
+        view, rate_limit, max_in_flight = self.limits(request)
+        if rate_limit:
+            wait = await atake_token(view, client_id(request), *rate_limit)
+            if wait:
+                return self.reject(view, "rate_limited", wait)
+        if max_in_flight is None:
+            if rate_limit:
+                count(view, "admitted")
+            return await self.get_response(request)
+        if not writes.acquire(max_in_flight):
+            return self.reject(view, "shed")
+        count(view, "admitted")
+        try:
+            return await self.get_response(request)
+        finally:
+            writes.release()
+
+    def limits(self, request):
+        """(view name, rate limit, in flight limit) of requested view, limits are None when not applied"""
+        if not getattr(settings, "ADMISSION_CONTROL", True):
+            return None, None, None
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None, None, None
+        request.resolver_match = match  # so rejected requests are reported under their view
+        return (match.view_name, *view_limits(match.view_name))
+
+    def reject(self, view, outcome, wait=None):
+        count(view, outcome)
+        response = JsonResponse({"error": "Too many requests, retry later"}, status=429)
+        retry_after = getattr(settings, "ADMISSION_RETRY_AFTER", DEFAULT_RETRY_AFTER) if wait is None else wait
+        response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
@@ -0,0 +1,27 @@
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+
+
+class ThreadedStreamingMixin:
+    """Serve a sync iterator under ASGI one chunk at a time. Django would read a sync iterator whole
+    with sync_to_async(list), holding big exports in memory. Each chunk is produced in the thread
+    running sync code (thread_sensitive), so a server side cursor stays on its connection.
+    WSGI still iterates it directly."""
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in self.streaming_content:
+                yield part
+            return
+        iterator = iter(self.streaming_content)
+        next_chunk = sync_to_async(next)
+        while (part := await next_chunk(iterator, None)) is not None:
+            yield part
+
+
+class ThreadedStreamingHttpResponse(ThreadedStreamingMixin, StreamingHttpResponse):
+    pass
+
+
+class ThreadedFileResponse(ThreadedStreamingMixin, FileResponse):
+    pass
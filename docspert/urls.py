@@ -18,9 +18,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from accounts.views import AccountsHomeView
+from .views import MetricsView
 
 urlpatterns = [
     path("", AccountsHomeView.as_view(), name="accounts_home"),
     path("admin/", admin.site.urls),
     path("accounts/", include("accounts.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
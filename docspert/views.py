@@ -0,0 +1,12 @@
+from django.http import Http404, HttpResponse
+from django.views import View
+from .metrics import is_metrics_client, registry
+
+
+class MetricsView(View):
+    """Expose in memory request metrics in Prometheus text format, served to local addresses only"""
+
+    def get(self, request):
+        if not is_metrics_client(request):
+            raise Http404
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,32 @@
+"""
+Gunicorn config of production run mode (see startup.sh).
+
+Serves docspert.asgi with uvicorn workers, so async views (search, transfer) run on the event loop.
+Every setting can be overridden from environment (WEB_CONCURRENCY, PORT...) or command line.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# 2 workers per CPU + 1, the usual start point for a mix of cpu & database bound requests
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Load django once in master process then fork workers, faster boot & shared memory.
+# Code changes need a new master: `kill -USR2 <master pid>` then `kill -WINCH` / `-QUIT` the old one,
+# `kill -HUP` gracefully restarts workers with the already loaded code.
+preload_app = True
+
+# Let requests in progress finish on restart / shutdown
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))  # large uploads are parsed in the request
+keepalive = 5
+
+# Recycle workers from time to time, jitter so they don't restart together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
@@ -1,3 +1,12 @@
-python3 manage.py makemigrations
-python3 manage.py migrate
-python3 manage.py runserver 0.0.0.0:8000
+# DOCSPERT_RUN_MODE=production: gunicorn with uvicorn workers & static files collected for whitenoise
+# otherwise: django development server
+# Migrations are part of the source, they are only applied here, never generated at boot
+python3 manage.py migrate --noinput
+
+if [ "$DOCSPERT_RUN_MODE" = "production" ]; then
+    python3 manage.py collectstatic --noinput
+    python3 manage.py createcachetable  # accounts cache shared by all workers (PostgreSQL without REDIS_URL)
+    exec gunicorn docspert.asgi:application -c gunicorn.conf.py
+fi
+
+exec python3 manage.py runserver 0.0.0.0:8000